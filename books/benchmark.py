@@ -0,0 +1,105 @@
+import os
+import io
+import sys
+import csv
+import json
+import time
+import argparse
+import platform
+import tempfile
+import contextlib
+
+import books
+import generate_books
+
+"""This program times each phase of a books.py search on synthetic books files of several sizes (see generate_books.py) and prints the timings as JSON, so that runs before and after a change can be compared. Run "benchmark.py -h" for its options."""
+
+def main():
+	"""Reads the command line, runs the benchmark on a synthetic file of each size and prints (or saves) the JSON report."""
+	command_line_arguments = get_command_line_arguments()
+	dictionary_of_search_commands = books.turn_arguments_into_dictionary(command_line_arguments)
+	report = {
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"repeat": command_line_arguments.repeat,
+		"search": {str(search_category): search_strings for search_category, search_strings in dictionary_of_search_commands.items()},
+		"results": [],
+	}
+	with tempfile.TemporaryDirectory() as directory:
+		for number_of_rows in command_line_arguments.rows:
+			csv_file_name = os.path.join(directory, "books_" + str(number_of_rows) + ".csv")
+			with open(csv_file_name, "w", newline="") as csvbooks:
+				generate_books.write_synthetic_books(csvbooks, number_of_rows, command_line_arguments.seed)
+			report["results"].append(benchmark_csv_file(csv_file_name, number_of_rows, dictionary_of_search_commands, command_line_arguments.repeat))
+			print("Benchmarked " + str(number_of_rows) + " rows", file=sys.stderr)
+	report_json = json.dumps(report, indent=2)
+	if command_line_arguments.output:
+		with open(command_line_arguments.output, "w") as report_file:
+			report_file.write(report_json + "\n")
+	else:
+		print(report_json)
+
+def get_command_line_arguments():
+	"""Return parsed arguments made using argparse."""
+	parser = argparse.ArgumentParser(description="Times the phases of a books.py search on synthetic books files and prints the timings as JSON.")
+	parser.add_argument("--rows", "-r", type=int, nargs="+", default=[10000, 100000, 1000000], help="the sizes of the synthetic files, in rows (default 10000 100000 1000000)")
+	parser.add_argument("--repeat", "-n", type=int, default=3, help="how many times each phase is run, keeping the fastest time (default 3)")
+	parser.add_argument("--seed", "-s", type=int, default=257, help="the random seed of the synthetic files (default 257)")
+	parser.add_argument("--author", "-a", default="austen, morrison", help='the authors searched for (default "austen, morrison")')
+	parser.add_argument("--title", "-t", default="night", help='the title searched for (default "night")')
+	parser.add_argument("--year", "-y", default="1900-1905, 2000-2005", help='the year ranges searched for (default "1900-1905, 2000-2005")')
+	parser.add_argument("--output", "-o", help="the file to save the JSON report to, instead of printing it")
+	return parser.parse_args()
+
+def benchmark_csv_file(csv_file_name, number_of_rows, dictionary_of_search_commands, repeat):
+	"""Returns a dictionary of the size of the csv file and the fastest time in seconds of each phase of searching it: parsing the csv, cleaning the authors, each search predicate over every row, printing the results, and the full serial scan, cache and index builds and cached search."""
+	csv_title_index = 0; csv_year_index = 1; csv_author_index = 2
+	csv_rows = read_csv_rows(csv_file_name)
+	dictionary_of_search_results = books.scan_csv_into_dictionary(dictionary_of_search_commands, csv_file_name)
+	books_cache = books.build_books_cache(csv_file_name)
+	books_index = books.build_books_index(books_cache)
+	phases = {
+		"parse": time_phase(repeat, lambda: read_csv_rows(csv_file_name)),
+		"clean_row_author_info": time_phase(repeat, lambda: [books.clean_row_author_info(csv_row[csv_author_index].lower()) for csv_row in csv_rows]),
+		"title_is_in_row": time_phase(repeat, lambda: [books.title_is_in_row(search_string, csv_row[csv_title_index]) for search_string in dictionary_of_search_commands.get(csv_title_index, []) for csv_row in csv_rows]),
+		"author_is_in_row": time_phase(repeat, lambda: [books.author_is_in_row(search_string, csv_row[csv_author_index]) for search_string in dictionary_of_search_commands.get(csv_author_index, []) for csv_row in csv_rows]),
+		"row_year_is_in_bounds": time_phase(repeat, lambda: [books.row_year_is_in_bounds(search_string, csv_row[csv_year_index]) for search_string in dictionary_of_search_commands.get(csv_year_index, []) for csv_row in csv_rows]),
+		"print_search_results": time_phase(repeat, lambda: print_search_results_to_string(dictionary_of_search_commands, dictionary_of_search_results)),
+		"scan_csv_into_dictionary": time_phase(repeat, lambda: books.scan_csv_into_dictionary(dictionary_of_search_commands, csv_file_name)),
+		"build_books_cache": time_phase(repeat, lambda: books.build_books_cache(csv_file_name)),
+		"build_books_index": time_phase(repeat, lambda: books.build_books_index(books_cache)),
+		"search_books_into_dictionary": time_phase(repeat, lambda: books.search_books_into_dictionary(books_cache, books_index, dictionary_of_search_commands)),
+	}
+	return {
+		"rows": number_of_rows,
+		"file_size": os.path.getsize(csv_file_name),
+		"matches": {search_string: len(rows) for search_string, rows in dictionary_of_search_results.items()},
+		"seconds": phases,
+	}
+
+def read_csv_rows(csv_file_name):
+	"""Returns the list of rows of the csv file, read the way books.py reads it."""
+	with open(csv_file_name, newline="\n") as csvbooks:
+		return list(csv.reader(csvbooks, delimiter=",", quotechar="\""))
+
+def print_search_results_to_string(dictionary_of_search_commands, dictionary_of_search_results):
+	"""Runs print_search_results with its output captured in a string instead of printed, and returns the string."""
+	output = io.StringIO()
+	with contextlib.redirect_stdout(output):
+		books.print_search_results(dictionary_of_search_commands, dictionary_of_search_results)
+	return output.getvalue()
+
+def time_phase(repeat, phase):
+	"""Runs the passed function the passed number of times and returns the fastest run in seconds."""
+	fastest_time = None
+	for run_number in range(repeat):
+		start_time = time.perf_counter()
+		phase()
+		run_time = time.perf_counter() - start_time
+		if fastest_time is None or run_time < fastest_time:
+			fastest_time = run_time
+	return round(fastest_time, 6)
+
+"""The main method is called and the method is executed."""
+if __name__ == "__main__":
+	main()
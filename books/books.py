@@ -2,11 +2,31 @@
 #revised by: Kai Johnson, Songyan Zhao, and Kyosuke Imai
 
 import sys
+import os
 import csv 
+import io
+import json
+import time
+import socket
+import stat
+import socketserver
+import threading
 import argparse
+import hashlib
+import concurrent.futures
+import mmap
+import tempfile
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right
 from collections import defaultdict
+from itertools import repeat
 import re
 
+compiled_file_magic = b"books.py compiled file 1\n"
+trigram_key_size = 12
+ascii_author_info_deletions = b"0123456789()-"
+
 """This program provides a command line interface for searching for books with certain authors, publication years, and titles in the data file "books.csv" and then printing the search result.  For description of the CLI tags offered by this program, see the "usage.txt" in this folder.  To run this program, run "books.py"."""
 
 def main():
@@ -15,12 +35,23 @@ def main():
 
 	if need_help(command_line_arguments): 
 		print_usage_txt()
+	elif command_line_arguments.batch:
+		run_batch_searches(command_line_arguments.batch)
+	elif command_line_arguments.serve:
+		serve_books_searches(command_line_arguments.serve)
 	elif invalid_year_format(command_line_arguments):
 		print_invalid_year_format_error_message()
 	else: 
 		dictionary_of_search_commands = turn_arguments_into_dictionary(command_line_arguments)
 
-		dictionary_of_search_results = search_csv_into_dictionary(dictionary_of_search_commands)
+		if command_line_arguments.connect:
+			dictionary_of_search_results = request_search_from_server(command_line_arguments.connect, command_line_arguments)
+			if dictionary_of_search_results is None:
+				return
+		elif command_line_arguments.workers:
+			dictionary_of_search_results = scan_csv_into_dictionary_in_parallel(dictionary_of_search_commands, workers=command_line_arguments.workers)
+		else:
+			dictionary_of_search_results = search_csv_into_dictionary(dictionary_of_search_commands)
 
 		print_search_results(dictionary_of_search_commands, dictionary_of_search_results)
 
@@ -31,11 +62,15 @@ def get_command_line_arguments():
 	parser.add_argument("--author", "-a", help = 'Enter the authors name, e.g. --author "Austen, morrison, tolstoy". Support mutiple search.')
 	parser.add_argument("--title", "-t",  type =str, help = 'Enter the title name, e.g. -t "Crime and PUNishment".')
 	parser.add_argument("--year", "-y", help = 'Enter the year or year range, e.g. --year "1980-1991".')
+	parser.add_argument("--batch", "-b", help = 'Run every search in the passed file of JSON search lines ("-" for stdin) in one pass and print the results as JSON lines, e.g. --batch searches.jsonl.')
+	parser.add_argument("--serve", help = 'Keep the books loaded and answer searches sent to the passed Unix socket path, e.g. --serve /tmp/books.sock.')
+	parser.add_argument("--connect", "-c", help = 'Send the search to the server listening on the passed Unix socket path, e.g. -c /tmp/books.sock -a "austen".')
+	parser.add_argument("--workers", "-w", type=int, help = 'Scan the csv file directly with this many processes instead of using the search cache, e.g. --workers 4.')
 	return parser.parse_args()	
 
 def need_help(command_line_arguments):
 	"""This method returns true if '-h, --help, help' is entered in the command line argument or if there is no argument entered. Otherwise, returns false."""
-	has_argument = command_line_arguments.title or command_line_arguments.author or command_line_arguments.year
+	has_argument = command_line_arguments.title or command_line_arguments.author or command_line_arguments.year or command_line_arguments.batch or command_line_arguments.serve
 	if command_line_arguments.help or not has_argument: 
 		return True
 	return False
@@ -69,18 +104,491 @@ def turn_arguments_into_dictionary(command_line_arguments):
 		dictionary_of_search_commands[csv_author_index] = command_line_arguments.author.split(", ")
 	return dictionary_of_search_commands
 
-def search_csv_into_dictionary(dictionary_of_search_commands):
-	"""Returns a dictionary with key search strings and value csv rows that satisfy the search command, from data file books.csv."""
+def search_csv_into_dictionary(dictionary_of_search_commands, csv_file_name="books.csv"):
+	"""Returns a dictionary with key search strings and value csv rows that satisfy the search command, from data file books.csv. The rows are read from the compiled cache of the file and narrowed down with its index (both rebuilt when the file changes)."""
+	books_cache = get_books_cache(csv_file_name)
+	books_index = get_books_index(csv_file_name, books_cache)
+	return search_books_into_dictionary(books_cache, books_index, dictionary_of_search_commands)
+
+def search_books_into_dictionary(books_cache, books_index, dictionary_of_search_commands):
+	"""Returns a dictionary with key search strings and value rows of the cached books that satisfy the search command. Only the candidate rows given by the index are checked, and the results keep the order of the rows in the file."""
+	return search_books_into_dictionaries(books_cache, books_index, [dictionary_of_search_commands])[0]
+
+def search_books_into_dictionaries(books_cache, books_index, list_of_dictionaries_of_search_commands):
+	"""Returns a list holding, for each passed dictionary of search commands, the dictionary of its search results (see search_books_into_dictionary). Each different search string of a category is looked up once however many searches share it, and each search's results are then read from the sorted matches of its own search strings, so the work grows with the number of matches rather than with matches times searches."""
+	dictionary_of_matching_row_ids = {}
+	for dictionary_of_search_commands in list_of_dictionaries_of_search_commands:
+		for search_category in dictionary_of_search_commands:
+			for search_string in dictionary_of_search_commands[search_category]:
+				if (search_category, search_string) not in dictionary_of_matching_row_ids:
+					dictionary_of_matching_row_ids[(search_category, search_string)] = sorted(get_matching_row_ids(books_cache, books_index, search_category, search_string))
+	dictionary_of_cached_rows = {row_id: get_cached_row(books_cache, row_id) for row_id in set().union(*dictionary_of_matching_row_ids.values())}
+	list_of_dictionaries_of_search_results = []
+	for dictionary_of_search_commands in list_of_dictionaries_of_search_commands:
+		dictionary_of_lists_of_row_ids = defaultdict(list)
+		for search_category in dictionary_of_search_commands:
+			for search_string in dictionary_of_search_commands[search_category]:
+				dictionary_of_lists_of_row_ids[search_string].append(dictionary_of_matching_row_ids[(search_category, search_string)])
+		dictionary_of_search_results = defaultdict(list)
+		for search_string, lists_of_row_ids in dictionary_of_lists_of_row_ids.items():
+			row_ids = lists_of_row_ids[0] if len(lists_of_row_ids) == 1 else heapq.merge(*lists_of_row_ids)
+			list_of_rows = [dictionary_of_cached_rows[row_id] for row_id in row_ids]
+			if list_of_rows:
+				dictionary_of_search_results[search_string] = list_of_rows
+		list_of_dictionaries_of_search_results.append(dictionary_of_search_results)
+	return list_of_dictionaries_of_search_results
+
+def get_matching_row_ids(books_cache, books_index, search_category, search_string):
+	"""Returns the ids of the cached rows that satisfy the search string in its category, the same rows search_string_is_in_row accepts. A year range is answered by the year index alone, its bounds parsed once; only the candidate rows of a title or author search string are read from the cache, lowercased (and for authors cleaned) and checked."""
+	csv_title_index = 0; csv_year_index = 1; csv_author_index = 2
+	if search_category == csv_year_index:
+		return get_row_ids_in_year_range(books_index, years_search_string=search_string)
+	elif search_category == csv_title_index:
+		lowercased_search_string = search_string.lower()
+		return [row_id for row_id in get_candidate_row_ids(books_index, search_category, search_string) if lowercased_search_string in get_cached_text(books_cache, "title", row_id).lower()]
+	elif search_category == csv_author_index:
+		lowercased_search_string = search_string.lower()
+		return [row_id for row_id in get_candidate_row_ids(books_index, search_category, search_string) if lowercased_search_string in clean_row_author_info(get_cached_text(books_cache, "author", row_id).lower())]
+	return []
+
+def get_cached_row(books_cache, row_id):
+	"""Returns the title, year and author of the cached row as a csv row."""
+	return [get_cached_text(books_cache, "title", row_id), get_cached_text(books_cache, "year", row_id), get_cached_text(books_cache, "author", row_id)]
+
+def get_cached_text(books_cache, column_name, row_id):
+	"""Returns the text of the cached row in the passed column ("title", "year" or "author"), read from the column's text at the row's offsets."""
+	column_offsets = books_cache[column_name + "_offsets"]
+	return str(books_cache[column_name + "_text"][column_offsets[row_id]:column_offsets[row_id + 1]], "utf-8")
+
+def get_candidate_row_ids(books_index, search_category, search_string):
+	"""Returns the ids of the rows that could satisfy the title or author search string: the rows holding every trigram of the search string, or every row when the index can't narrow the search."""
+	csv_title_index = 0; csv_author_index = 2
+	if search_category == csv_title_index:
+		column_name = "title"
+	elif search_category == csv_author_index:
+		column_name = "author"
+	else:
+		return range(books_index["row_count"])
+	search_trigrams = get_trigrams(search_string.lower())
+	if not search_trigrams:
+		return range(books_index["row_count"])
+	list_of_row_id_arrays = []
+	for trigram in search_trigrams:
+		row_ids = get_trigram_row_ids(books_index, column_name, trigram)
+		if row_ids is None:
+			return []
+		list_of_row_id_arrays.append(row_ids)
+	list_of_row_id_arrays.sort(key=len)
+	candidate_row_ids = set(list_of_row_id_arrays[0])
+	for row_ids in list_of_row_id_arrays[1:]:
+		candidate_row_ids.intersection_update(row_ids)
+	return sorted(candidate_row_ids)
+
+def get_trigram_row_ids(books_index, column_name, trigram):
+	"""Returns the ids of the rows whose column ("title" or "author") holds the trigram, found by binary search of the column's sorted trigrams, or None if no row holds it."""
+	trigrams = books_index[column_name + "_trigrams"]
+	low = 0; high = len(trigrams) // trigram_key_size
+	while low < high:
+		middle = (low + high) // 2
+		if str(trigrams[middle * trigram_key_size:(middle + 1) * trigram_key_size], "utf-32-be") < trigram:
+			low = middle + 1
+		else:
+			high = middle
+	if low == len(trigrams) // trigram_key_size or str(trigrams[low * trigram_key_size:(low + 1) * trigram_key_size], "utf-32-be") != trigram:
+		return None
+	trigram_offsets = books_index[column_name + "_trigram_offsets"]
+	return books_index[column_name + "_trigram_row_ids"][trigram_offsets[low]:trigram_offsets[low + 1]]
+
+def get_row_ids_in_year_range(books_index, years_search_string):
+	"""Returns the ids of the rows published in the passed year range "A-B" (in either order), found by binary search of the sorted years."""
+	low_year, high_year = get_year_bounds(years_search_string)
+	sorted_years = books_index["sorted_years"]
+	start = bisect_left(sorted_years, low_year)
+	end = bisect_right(sorted_years, high_year, start)
+	return books_index["year_row_ids"][start:end]
+
+def get_trigrams(text):
+	"""Returns the set of three-character substrings of the passed text."""
+	return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def get_books_cache(csv_file_name):
+	"""Returns the compiled cache of the csv file, saved as "books.csv.cache" next to it."""
+	return get_compiled_file(csv_file_name + ".cache", csv_file_name, lambda: build_books_cache(csv_file_name))
+
+def get_books_index(csv_file_name, books_cache):
+	"""Returns the search index of the csv file, saved as "books.csv.index" next to it and built from its compiled cache."""
+	return get_compiled_file(csv_file_name + ".index", csv_file_name, lambda: build_books_index(books_cache))
+
+def get_compiled_file(compiled_file_name, csv_file_name, build_compiled_data):
+	"""Returns the data saved in the compiled file, or builds it with the passed function and saves it if the file is missing or the csv file has changed since. A csv file whose size and modification time are unchanged is taken as unchanged; otherwise its contents are hashed, so a file that was only touched doesn't need a rebuild."""
+	csv_file_signature = get_file_signature(csv_file_name)
+	compiled_data = load_compiled_file(compiled_file_name)
+	if compiled_data is not None:
+		compiled_signature = compiled_data.get("signature", {})
+		if compiled_signature.get("size") == csv_file_signature["size"] and compiled_signature.get("mtime") == csv_file_signature["mtime"]:
+			return compiled_data
+		if compiled_signature.get("size") == csv_file_signature["size"] and compiled_signature.get("sha1") == get_file_sha1(csv_file_name):
+			compiled_data["signature"] = dict(csv_file_signature, sha1=compiled_signature["sha1"])
+			save_compiled_file(compiled_data, compiled_file_name)
+			return compiled_data
+	compiled_data = build_compiled_data()
+	compiled_data["signature"] = dict(csv_file_signature, sha1=get_file_sha1(csv_file_name))
+	save_compiled_file(compiled_data, compiled_file_name)
+	return compiled_data
+
+def get_file_signature(file_name):
+	"""Returns the size and modification time of the passed file, used to tell when a file built from it is out of date."""
+	file_status = os.stat(file_name)
+	return {"size": file_status.st_size, "mtime": file_status.st_mtime_ns}
+
+def get_file_sha1(file_name):
+	"""Returns the hex SHA-1 digest of the contents of the passed file."""
+	file_hash = hashlib.sha1()
+	with open(file_name, "rb") as hashed_file:
+		for block in iter(lambda: hashed_file.read(1 << 20), b""):
+			file_hash.update(block)
+	return file_hash.hexdigest()
+
+def load_compiled_file(compiled_file_name):
+	"""Returns the data saved in the compiled file, or None if it is missing or can't be loaded for any reason (truncated, written by another program, version or machine), so that it is rebuilt. The file is memory-mapped rather than read: each of its arrays and texts is a memoryview of the mapped file, so only the parts a search touches are ever read from disk."""
+	try:
+		with open(compiled_file_name, "rb") as compiled_file:
+			compiled_file_view = memoryview(mmap.mmap(compiled_file.fileno(), 0, access=mmap.ACCESS_READ))
+		header_start = len(compiled_file_magic) + 8
+		if compiled_file_view[:len(compiled_file_magic)] != compiled_file_magic:
+			raise ValueError("not a compiled file")
+		header_length = int.from_bytes(compiled_file_view[len(compiled_file_magic):header_start], "little")
+		header = json.loads(str(compiled_file_view[header_start:header_start + header_length], "utf-8"))
+		if header["byteorder"] != sys.byteorder:
+			raise ValueError("compiled on a machine of another byte order")
+		sections_start = get_padded_length(header_start + header_length)
+		compiled_data = header["data"]
+		for section_name, (section_format, item_size, section_offset, section_length) in header["sections"].items():
+			section_end = sections_start + section_offset + section_length
+			if section_end > len(compiled_file_view):
+				raise ValueError("truncated")
+			compiled_data[section_name] = compiled_file_view[sections_start + section_offset:section_end].cast(section_format)
+			if compiled_data[section_name].itemsize != item_size:
+				raise ValueError("compiled with another item size")
+	except Exception:
+		return None
+	return compiled_data
+
+def save_compiled_file(compiled_data, compiled_file_name):
+	"""Writes the data to the compiled file, replacing the old one only once the new one is complete. The file starts with a magic line and a JSON header holding the data's plain values and where each of its arrays and texts (bytes) is, followed by the raw contents of those, each 8-byte aligned so it can be memory-mapped as is. The data is first written to a temporary file of its own in the same directory, so several processes saving the same file at once don't write over each other. If the file can't be written the data is just used for this run."""
+	header = {"byteorder": sys.byteorder, "data": {}, "sections": {}}
+	list_of_sections = []
+	section_offset = 0
+	for name, value in compiled_data.items():
+		if isinstance(value, (bytes, array, memoryview)):
+			section = memoryview(value)
+			header["sections"][name] = [section.format, section.itemsize, section_offset, section.nbytes]
+			list_of_sections.append(section.cast("B") if section.format != "B" else section)
+			section_offset += get_padded_length(section.nbytes)
+		else:
+			header["data"][name] = value
+	header_bytes = json.dumps(header).encode("utf-8")
+	header_end = len(compiled_file_magic) + 8 + len(header_bytes)
+	temporary_file_name = None
+	try:
+		file_descriptor, temporary_file_name = tempfile.mkstemp(prefix=os.path.basename(compiled_file_name) + ".", suffix=".tmp", dir=os.path.dirname(os.path.abspath(compiled_file_name)))
+		with os.fdopen(file_descriptor, "wb") as compiled_file:
+			compiled_file.write(compiled_file_magic + len(header_bytes).to_bytes(8, "little") + header_bytes)
+			compiled_file.write(bytes(get_padded_length(header_end) - header_end))
+			for section in list_of_sections:
+				compiled_file.write(section)
+				compiled_file.write(bytes(get_padded_length(len(section)) - len(section)))
+		os.replace(temporary_file_name, compiled_file_name)
+	except OSError as e:
+		print("Could not save " + compiled_file_name + ": " + str(e), file=sys.stderr)
+		if temporary_file_name and os.path.exists(temporary_file_name):
+			os.remove(temporary_file_name)
+
+def get_padded_length(length):
+	"""Returns the passed length rounded up to a multiple of 8 bytes."""
+	return (length + 7) // 8 * 8
+
+def build_books_cache(csv_file_name):
+	"""Returns the number of rows of the csv file and, for each of its title, year and author columns, the text of its rows as written (one UTF-8 string after the other) and the array of the offsets where each row's text starts, plus the end of the last. The lowercased titles, cleaned authors and numeric years the searches compare against are derived from these when needed rather than stored."""
+	csv_title_index = 0; csv_year_index = 1; csv_author_index = 2
+	titles = []; years = []; authors = []
+	with open(csv_file_name, newline="\n") as csvbooks:
+		reader = csv.reader(csvbooks, delimiter=",", quotechar="\"")
+		for csv_row in reader:
+			if not csv_row:
+				continue
+			csv_row = csv_row + [""] * (csv_author_index + 1 - len(csv_row))
+			titles.append(csv_row[csv_title_index])
+			years.append(csv_row[csv_year_index])
+			authors.append(csv_row[csv_author_index])
+	books_cache = {"row_count": len(titles)}
+	for column_name, column_texts in (("title", titles), ("year", years), ("author", authors)):
+		column_text = "".join(column_texts).encode("utf-8")
+		column_offsets = [0]
+		for text in column_texts:
+			column_offsets.append(column_offsets[-1] + len(text.encode("utf-8")))
+		books_cache[column_name + "_text"] = column_text
+		books_cache[column_name + "_offsets"] = get_compact_array(column_offsets)
+	return books_cache
+
+def build_books_index(books_cache):
+	"""Returns a dictionary holding the number of cached rows, for the lowercased titles and cleaned authors their trigrams (sorted, each stored as 12 bytes of UTF-32) with the ids of the rows containing each one, and the numeric years sorted alongside the ids of their rows, all as compact arrays. Years too large for a 64-bit array, which no book has, are left out of the index."""
+	title_trigrams = defaultdict(list)
+	author_trigrams = defaultdict(list)
+	years_and_row_ids = []
+	for row_id in range(books_cache["row_count"]):
+		title, year, author = get_cached_row(books_cache, row_id)
+		for trigram in get_trigrams(title.lower()):
+			title_trigrams[trigram].append(row_id)
+		for trigram in get_trigrams(clean_row_author_info(author.lower())):
+			author_trigrams[trigram].append(row_id)
+		row_year = get_row_year(year)
+		if row_year is not None and -2 ** 63 <= row_year < 2 ** 63:
+			years_and_row_ids.append((row_year, row_id))
+	years_and_row_ids.sort()
+	books_index = {
+		"row_count": books_cache["row_count"],
+		"sorted_years": array("q", (row_year for row_year, row_id in years_and_row_ids)),
+		"year_row_ids": array("I", (row_id for row_year, row_id in years_and_row_ids)),
+	}
+	books_index.update(get_trigram_arrays("title", title_trigrams))
+	books_index.update(get_trigram_arrays("author", author_trigrams))
+	return books_index
+
+def get_trigram_arrays(column_name, dictionary_of_trigrams):
+	"""Returns the arrays of the index of the passed dictionary from each trigram of the column to the ids of the rows containing it: the sorted trigrams as UTF-32, the ids of the rows of each trigram one after the other, and the offsets where each trigram's row ids start, plus the end of the last."""
+	sorted_trigrams = sorted(dictionary_of_trigrams)
+	trigram_row_ids = array("I")
+	trigram_offsets = [0]
+	for trigram in sorted_trigrams:
+		trigram_row_ids.extend(dictionary_of_trigrams[trigram])
+		trigram_offsets.append(len(trigram_row_ids))
+	return {
+		column_name + "_trigrams": "".join(sorted_trigrams).encode("utf-32-be"),
+		column_name + "_trigram_offsets": get_compact_array(trigram_offsets),
+		column_name + "_trigram_row_ids": trigram_row_ids,
+	}
+
+def get_compact_array(offsets):
+	"""Returns the passed increasing offsets as an array of 32-bit items, or of 64-bit items if the last one doesn't fit in 32 bits."""
+	return array("I" if offsets[-1] < 2 ** 32 else "Q", offsets)
+
+def run_batch_searches(batch_file_name, csv_file_name="books.csv"):
+	"""Reads one JSON search per line (an object with any of the "title", "author" and "year" strings the matching command line tags take) from the batch file, or stdin if it is "-", runs them all together and prints one JSON line of results (or of the error) for each search, in order. Exits with status 1 if the batch file can't be read."""
+	if batch_file_name == "-":
+		list_of_batch_searches = read_batch_searches(sys.stdin)
+	else:
+		try:
+			with open(batch_file_name) as batch_file:
+				list_of_batch_searches = read_batch_searches(batch_file)
+		except (OSError, UnicodeDecodeError) as e:
+			print("Could not read the batch file " + batch_file_name + ": " + str(e), file=sys.stderr)
+			sys.exit(1)
+	list_of_dictionaries_of_search_commands = [dictionary_of_search_commands for batch_search, dictionary_of_search_commands, error in list_of_batch_searches if not error]
+	books_cache = get_books_cache(csv_file_name)
+	books_index = get_books_index(csv_file_name, books_cache)
+	iterator_of_search_results = iter(search_books_into_dictionaries(books_cache, books_index, list_of_dictionaries_of_search_commands))
+	for batch_search, dictionary_of_search_commands, error in list_of_batch_searches:
+		if error:
+			print(json.dumps({"search": batch_search, "error": error}))
+		else:
+			print(json.dumps({"search": batch_search, "results": get_batch_results(dictionary_of_search_commands, next(iterator_of_search_results))}))
+
+def read_batch_searches(batch_file):
+	"""Returns a list of (search, dictionary of search commands, error message) for each non-blank line of the batch file, with the error message empty when the search is valid."""
+	list_of_batch_searches = []
+	for line in batch_file:
+		if not line.strip():
+			continue
+		try:
+			batch_search = json.loads(line)
+		except ValueError:
+			list_of_batch_searches.append((line.strip(), None, "The search is not valid JSON."))
+			continue
+		dictionary_of_search_commands, error = get_search_commands_of_json_search(batch_search)
+		list_of_batch_searches.append((batch_search, dictionary_of_search_commands, error))
+	return list_of_batch_searches
+
+def get_search_commands_of_json_search(json_search):
+	"""Returns the dictionary of search commands of the passed JSON search (an object with any of the "title", "author" and "year" strings) and an error message, with the dictionary None and the message filled in when the search isn't valid."""
+	if not isinstance(json_search, dict) or not all(isinstance(json_search.get(tag), (str, type(None))) for tag in ("title", "author", "year")):
+		return None, "The search should be an object with \"title\", \"author\" and/or \"year\" strings."
+	search_arguments = argparse.Namespace(help=False, batch=None, serve=None, title=json_search.get("title"), author=json_search.get("author"), year=json_search.get("year"))
+	if need_help(search_arguments):
+		return None, "The search has no title, author or year."
+	elif invalid_year_format(search_arguments):
+		return None, "The years don't fit the format \"A-B\", or \"A-B, C-D\" for several ranges."
+	return turn_arguments_into_dictionary(search_arguments), ""
+
+def get_batch_results(dictionary_of_search_commands, dictionary_of_search_results):
+	"""Returns the search results as a list, in the order print_search_results prints them, of the category, search string and books found for each search string."""
+	csv_title_index = 0; csv_year_index = 1; csv_author_index = 2
+	category_names = {csv_title_index: "title", csv_year_index: "year", csv_author_index: "author"}
+	batch_results = []
+	for search_category in dictionary_of_search_commands:
+		for search_string in dictionary_of_search_commands.get(search_category):
+			books = [{"title": book_csv_row[csv_title_index], "year": book_csv_row[csv_year_index], "author": book_csv_row[csv_author_index]} for book_csv_row in dictionary_of_search_results.get(search_string, [])]
+			batch_results.append({"category": category_names[search_category], "search_string": search_string, "books": books})
+	return batch_results
+
+def serve_books_searches(socket_path, csv_file_name="books.csv"):
+	"""Loads the books once and answers the searches sent to the Unix socket at the passed path until interrupted, each client in its own thread. Each search is a line holding a JSON search (see get_search_commands_of_json_search) and is answered with a line holding a JSON object of its "results" by search string, or its "error", and the "latency_ms" it took. The books are reloaded when the csv file changes. Exits with status 1 if the path is taken by anything but the socket of a server that has stopped."""
+	error = remove_stale_socket(socket_path)
+	if error:
+		print(error, file=sys.stderr)
+		sys.exit(1)
+	with socketserver.ThreadingUnixStreamServer(socket_path, BooksSearchHandler) as server:
+		server.csv_file_name = csv_file_name
+		server.reload_lock = threading.Lock()
+		server.books = load_books_for_server(csv_file_name)
+		print("Serving searches of " + csv_file_name + " on " + socket_path, file=sys.stderr)
+		try:
+			server.serve_forever()
+		except KeyboardInterrupt:
+			pass
+		finally:
+			os.remove(socket_path)
+
+def remove_stale_socket(socket_path):
+	"""Removes the socket left at the passed path by a server that has stopped, so a new server can listen there, and returns None. Returns an error message instead, leaving the path as it is, if it is anything but a socket (such as a typo naming the data file) or a server is still answering on it."""
+	try:
+		path_status = os.lstat(socket_path)
+	except FileNotFoundError:
+		return None
+	except OSError as e:
+		return "Could not check " + socket_path + ": " + str(e)
+	if not stat.S_ISSOCK(path_status.st_mode):
+		return socket_path + " already exists and is not a socket, so it was left as it is."
+	with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe_socket:
+		try:
+			probe_socket.connect(socket_path)
+		except ConnectionRefusedError:
+			os.remove(socket_path)
+			return None
+		except OSError as e:
+			return "Could not check " + socket_path + ": " + str(e)
+	return "A server is already listening on " + socket_path + "."
+
+class BooksSearchHandler(socketserver.StreamRequestHandler):
+	"""Answers the line-delimited JSON searches sent over one connection to the books search server."""
+	def handle(self):
+		for line in self.rfile:
+			response = answer_json_search(self.server, line)
+			self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+
+def answer_json_search(server, line):
+	"""Returns the JSON response to the passed line holding a JSON search and prints how long it took."""
+	start_time = time.perf_counter()
+	try:
+		json_search = json.loads(line)
+	except ValueError:
+		json_search = None
+	dictionary_of_search_commands, error = get_search_commands_of_json_search(json_search)
+	if error:
+		response = {"error": error}
+	else:
+		books_cache, books_index = get_current_books_of_server(server)["books"]
+		response = {"results": search_books_into_dictionary(books_cache, books_index, dictionary_of_search_commands)}
+	response["latency_ms"] = round((time.perf_counter() - start_time) * 1000, 3)
+	print("Search " + line.decode("utf-8", "replace").strip() + " answered in " + str(response["latency_ms"]) + " ms", file=sys.stderr)
+	return response
+
+def load_books_for_server(csv_file_name):
+	"""Returns the compiled cache and index of the csv file, with the signature of the file they were loaded from."""
+	csv_file_signature = get_file_signature(csv_file_name)
+	books_cache = get_books_cache(csv_file_name)
+	return {"signature": csv_file_signature, "books": (books_cache, get_books_index(csv_file_name, books_cache))}
+
+def get_current_books_of_server(server):
+	"""Returns the books loaded by the server, first reloading them if the csv file has changed since they were loaded. Only one thread reloads, while searches already running keep the books they started with."""
+	if get_file_signature(server.csv_file_name) != server.books["signature"]:
+		with server.reload_lock:
+			if get_file_signature(server.csv_file_name) != server.books["signature"]:
+				server.books = load_books_for_server(server.csv_file_name)
+				print("Reloaded " + server.csv_file_name, file=sys.stderr)
+	return server.books
+
+def request_search_from_server(socket_path, command_line_arguments):
+	"""Sends the search of the command line arguments to the server listening on the passed Unix socket and returns its dictionary of search results, or prints the error and returns None if the search failed."""
+	json_search = {"title": command_line_arguments.title, "author": command_line_arguments.author, "year": command_line_arguments.year}
+	try:
+		with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server_socket:
+			server_socket.connect(socket_path)
+			server_socket.sendall((json.dumps(json_search) + "\n").encode("utf-8"))
+			response = json.loads(server_socket.makefile("rb").readline())
+	except (OSError, ValueError) as e:
+		print("Could not search through the server at " + socket_path + ": " + str(e), file=sys.stderr)
+		return None
+	if response.get("error"):
+		print(response["error"], file=sys.stderr)
+		return None
+	return response["results"]
+
+def scan_csv_into_dictionary(dictionary_of_search_commands, csv_file_name="books.csv"):
+	"""Returns the same dictionary as search_csv_into_dictionary by reading through every row of the csv file, without the search cache."""
 	dictionary_of_search_results = defaultdict(list)
-	with open('books.csv', newline="\n") as csvbooks:
-			reader = csv.reader(csvbooks, delimiter=",", quotechar="\"")
-			for csv_row in reader:
-				for search_category in dictionary_of_search_commands:
-					for search_string in dictionary_of_search_commands[search_category]:
-						if search_string_is_in_row(search_category, search_string, csv_row):
-							dictionary_of_search_results[search_string].append(csv_row)
+	with open(csv_file_name, newline="\n") as csvbooks:
+		reader = csv.reader(csvbooks, delimiter=",", quotechar="\"")
+		for search_string, csv_row in get_matches_of_csv_rows(dictionary_of_search_commands, reader):
+			dictionary_of_search_results[search_string].append(csv_row)
 	return dictionary_of_search_results
 
+def scan_csv_into_dictionary_in_parallel(dictionary_of_search_commands, csv_file_name="books.csv", workers=os.cpu_count(), minimum_parallel_file_size=8 * 1024 * 1024):
+	"""Returns the same dictionary as scan_csv_into_dictionary, scanning chunks of the csv file in a pool of worker processes and merging their matches back in file order. Files smaller than minimum_parallel_file_size are scanned serially, as starting the workers would cost more than it saves."""
+	if workers < 2 or os.path.getsize(csv_file_name) < minimum_parallel_file_size:
+		return scan_csv_into_dictionary(dictionary_of_search_commands, csv_file_name)
+	dictionary_of_search_results = defaultdict(list)
+	chunk_boundaries = get_csv_chunk_boundaries(csv_file_name, number_of_chunks=workers * 4)
+	with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+		for chunk_matches in executor.map(scan_csv_chunk, repeat(dictionary_of_search_commands), repeat(csv_file_name), chunk_boundaries[:-1], chunk_boundaries[1:]):
+			for search_string, csv_row in chunk_matches:
+				dictionary_of_search_results[search_string].append(csv_row)
+	return dictionary_of_search_results
+
+def scan_csv_chunk(dictionary_of_search_commands, csv_file_name, chunk_start, chunk_end):
+	"""Returns the list of (search string, csv row) matches of the rows between the passed byte offsets of the csv file. Run in the worker processes."""
+	with open(csv_file_name, "rb") as csvbooks:
+		csvbooks.seek(chunk_start)
+		chunk = io.TextIOWrapper(io.BytesIO(csvbooks.read(chunk_end - chunk_start)), newline="\n")
+	reader = csv.reader(chunk, delimiter=",", quotechar="\"")
+	return list(get_matches_of_csv_rows(dictionary_of_search_commands, reader))
+
+def get_matches_of_csv_rows(dictionary_of_search_commands, csv_rows):
+	"""Yields a (search string, csv row) pair, in order, for every search string of the search commands found in its category of each passed row."""
+	for csv_row in csv_rows:
+		if not csv_row:
+			continue
+		for search_category in dictionary_of_search_commands:
+			for search_string in dictionary_of_search_commands[search_category]:
+				if search_string_is_in_row(search_category, search_string, csv_row):
+					yield search_string, csv_row
+
+def get_csv_chunk_boundaries(csv_file_name, number_of_chunks):
+	"""Returns the byte offsets splitting the csv file into about number_of_chunks chunks, each starting at the beginning of a row. A newline ends a row when an even number of quote characters come before it, which holds for any csv file whose quotes only appear around quoted fields (as csv.writer writes them), including fields holding newlines."""
+	file_size = os.path.getsize(csv_file_name)
+	chunk_boundaries = [0]
+	quote_count = 0
+	position = 0
+	with open(csv_file_name, "rb") as csvbooks:
+		for chunk_number in range(1, number_of_chunks):
+			target_position = file_size * chunk_number // number_of_chunks
+			if target_position <= chunk_boundaries[-1]:
+				continue
+			while position < target_position:
+				block = csvbooks.read(min(1 << 20, target_position - position))
+				quote_count += block.count(b'"')
+				position += len(block)
+			for line in iter(csvbooks.readline, b""):
+				quote_count += line.count(b'"')
+				position += len(line)
+				if quote_count % 2 == 0 and line.endswith(b"\n"):
+					break
+			if position >= file_size:
+				break
+			chunk_boundaries.append(position)
+	chunk_boundaries.append(file_size)
+	return chunk_boundaries
+
 def search_string_is_in_row(search_category, search_string, csv_row):
 	"""Returns boolean representation of whether a given search string was found in its given category in a given row."""
 	csv_title_index = 0; csv_year_index = 1; csv_author_index = 2
@@ -97,27 +605,36 @@ def title_is_in_row(title_search_string, title_row):
 	return title_search_string.lower() in title_row.lower()
 
 def row_year_is_in_bounds(years_search_string, year_row):
-	"""Returns true if the year in the passed row is in the passed year bound."""
-	list_years_search_string = years_search_string.split("-")
+	"""Returns true if the year in the passed row is in the passed year bound. Years are compared as numbers, and a row whose year isn't a number is never in bounds."""
+	row_year = get_row_year(year_row)
+	if row_year is None:
+		return False
+	low_year, high_year = get_year_bounds(years_search_string)
+	return low_year <= row_year and row_year <= high_year
 
-	year_in_low_to_high_bounds = (list_years_search_string[0] <= year_row and year_row <= list_years_search_string[1])
-	year_in_high_to_low_bounds =  (list_years_search_string[1] <= year_row and year_row <= list_years_search_string[0])
+def get_year_bounds(years_search_string):
+	"""Returns the lower and upper years of the passed year range "A-B", which may be given from high to low."""
+	list_years_search_string = years_search_string.split("-")
+	first_year = int(list_years_search_string[0]); second_year = int(list_years_search_string[1])
+	return min(first_year, second_year), max(first_year, second_year)
 
-	return year_in_low_to_high_bounds or year_in_high_to_low_bounds
+def get_row_year(year_row):
+	"""Returns the year in the passed row as a number, or None if it isn't one."""
+	try:
+		return int(year_row)
+	except ValueError:
+		return None
 
 def author_is_in_row(author_search_string, author_row):
 	"""Returns true if the author search string is found at the author position in the row."""
 	return author_search_string.lower() in clean_row_author_info(author_row.lower())
 
 def clean_row_author_info(row_author_info):
-	"""Returns a string of author info stripped of parentheses or numericals"""
-	clean_row_author_info = ""
-	for i in range(len(row_author_info)):
-		undesirable_characters = "()-"
-		if row_author_info[i].isnumeric() or row_author_info[i] in undesirable_characters:
-			continue
-		clean_row_author_info += row_author_info[i]
-	return clean_row_author_info
+	"""Returns a string of author info stripped of parentheses or numericals. ASCII author info, where the only numericals are the digits, is cleaned in one bytes.translate."""
+	if row_author_info.isascii():
+		return row_author_info.encode("ascii").translate(None, ascii_author_info_deletions).decode("ascii")
+	undesirable_characters = "()-"
+	return "".join(character for character in row_author_info if not (character.isnumeric() or character in undesirable_characters))
 
 def print_search_results(dictionary_of_search_commands, dictionary_of_search_results):
 	"""Prints to the console the results of the user's search under headings for each different search string."""
@@ -153,4 +670,5 @@ def get_header_string(search_category, search_string):
 	return header_string + search_string
 
 """The main method is called and the method is executed."""
-main()
+if __name__ == "__main__":
+	main()
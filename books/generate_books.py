@@ -0,0 +1,73 @@
+import csv
+import argparse
+import random
+import itertools
+
+"""This program writes a synthetic books file in the format of "books.csv" (title, year published, author with birth and death years) for testing and benchmarking books.py on much more data. Run "generate_books.py -h" for its options."""
+
+TITLE_WORDS = ["the", "of", "and", "a", "in", "night", "house", "river", "war", "peace", "love", "time", "dog", "city", "garden", "king", "queen", "shadow", "light", "winter", "summer", "stone", "fire", "sea", "secret", "history", "life", "death", "dream", "road", "wind", "sister", "brother", "daughter", "ghost", "empire", "island", "mountain", "letters", "song", "crime", "punishment", "pride", "prejudice", "solitude", "wonderland", "thanks", "honor", "code", "jeeves", "orient", "express", "heights", "blackout"]
+FIRST_NAMES = ["Jane", "Toni", "Leo", "Agatha", "Connie", "Charlotte", "Emily", "Herman", "Gabriel", "Haruki", "Neil", "Terry", "Mary", "James", "Lois", "Pelham", "Khaled", "Peggy", "Laurence", "Tommy", "Sinclair", "Fyodor", "Virginia", "Chinua", "Zadie", "Kazuo", "Octavia", "Ursula", "Italo", "Jorge", "Chimamanda", "Orhan", "Wisława", "Mariana", "José", "Anaïs", "Søren", "Naguib"]
+LAST_NAMES = ["Austen", "Morrison", "Tolstoy", "Christie", "Willis", "Brontë", "Melville", "García Márquez", "Murakami", "Gaiman", "Pratchett", "Dunnewold", "Baldwin", "Bujold", "Wodehouse", "Hosseini", "Orenstein", "Sterne", "Orange", "Lewis", "Dostoevsky", "Woolf", "Achebe", "Smith", "Ishiguro", "Butler", "Le Guin", "Calvino", "Borges", "Adichie", "Pamuk", "Szymborska", "Enriquez", "Saramago", "Nin", "Kierkegaard", "Mahfouz"]
+
+def main():
+	"""Reads the command line and writes the synthetic books file."""
+	command_line_arguments = get_command_line_arguments()
+	with open(command_line_arguments.output, "w", newline="") as csvbooks:
+		write_synthetic_books(csvbooks, command_line_arguments.rows, command_line_arguments.seed)
+
+def get_command_line_arguments():
+	"""Return parsed arguments made using argparse."""
+	parser = argparse.ArgumentParser(description="Writes a synthetic books csv file in the format of books.csv.")
+	parser.add_argument("output", help="the csv file to write, e.g. books_1m.csv")
+	parser.add_argument("--rows", "-r", type=int, default=10000, help="the number of books to write (default 10000)")
+	parser.add_argument("--seed", "-s", type=int, default=257, help="the random seed, so the same file can be written again (default 257)")
+	return parser.parse_args()
+
+def write_synthetic_books(csvbooks, number_of_rows, seed):
+	"""Writes the passed number of synthetic book rows to the opened csv file, quoting titles that contain commas the way books.csv does."""
+	generator = random.Random(seed)
+	authors = get_synthetic_authors(generator, number_of_authors=max(10, number_of_rows // 20))
+	author_cumulative_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(authors))))
+	writer = csv.writer(csvbooks, lineterminator="\n")
+	for row_number in range(number_of_rows):
+		author_row, birth_year, death_year = generator.choices(authors, cum_weights=author_cumulative_weights)[0]
+		writer.writerow([get_synthetic_title(generator), str(get_synthetic_year(generator, birth_year, death_year)), author_row])
+
+def get_synthetic_authors(generator, number_of_authors):
+	"""Returns a list of (author string, birth year, death year or None) for the passed number of authors, where the author string is written like "Jane Austen (1775-1817)", with living authors written like "Toni Morrison (1931-)", and some books have two authors joined by "and"."""
+	authors = []
+	for author_number in range(number_of_authors):
+		birth_year = int(generator.triangular(1500, 2000, 1930))
+		death_year = birth_year + generator.randint(25, 95)
+		if death_year > 2021:
+			death_year = None
+		author_row = get_synthetic_author_name(generator) + " (" + str(birth_year) + "-" + (str(death_year) if death_year else "") + ")"
+		if generator.random() < 0.05:
+			co_author_birth_year = birth_year + generator.randint(-20, 20)
+			author_row += " and " + get_synthetic_author_name(generator) + " (" + str(co_author_birth_year) + "-)"
+		authors.append((author_row, birth_year, death_year))
+	return authors
+
+def get_synthetic_author_name(generator):
+	"""Returns a random author name, sometimes with a middle name."""
+	name_parts = [generator.choice(FIRST_NAMES)]
+	if generator.random() < 0.2:
+		name_parts.append(generator.choice(FIRST_NAMES))
+	name_parts.append(generator.choice(LAST_NAMES))
+	return " ".join(name_parts)
+
+def get_synthetic_title(generator):
+	"""Returns a random title of one to eight capitalized words, a few of them holding a comma."""
+	title_words = [word.capitalize() for word in generator.choices(TITLE_WORDS, k=generator.choice([1, 2, 2, 3, 3, 3, 4, 4, 5, 6, 8]))]
+	if len(title_words) > 2 and generator.random() < 0.1:
+		title_words[0] += ","
+	return " ".join(title_words)
+
+def get_synthetic_year(generator, birth_year, death_year):
+	"""Returns a publication year in the author's working life, between the ages of 20 and their death (or 2021)."""
+	last_year = min(death_year or 2021, 2021)
+	return generator.randint(min(birth_year + 20, last_year), last_year)
+
+"""The main method is called and the method is executed."""
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,70 @@
+import csv
+import random
+import argparse
+
+"""Writes a synthetic Olympics data set in the format of athlete_events.csv (and noc_regions.csv), at any number of rows, for testing and benchmarking load_olympics.py, olympics.py and olympics-api.py on more (or less) data than the real one. Run "generate_olympics.py -h" for its options."""
+
+athlete_events_columns = ['ID', 'Name', 'Sex', 'Age', 'Height', 'Weight', 'Team', 'NOC', 'Games', 'Year', 'Season', 'City', 'Sport', 'Event', 'Medal']
+
+first_names = ['Paavo', 'Larisa', 'Carl', 'Nadia', 'Jesse', 'Fanny', 'Usain', 'Birgit', 'Michael', 'Marit', 'Kip', 'Ole', 'Ryoko', 'Abebe', 'Sawao', 'Kristin', 'Edoardo', 'Simone', 'Ian', 'Teófilo', 'Věra', 'Haile', 'Björn', 'Zhang', 'Ana', 'Aladár']
+last_names = ['Nurmi', 'Latynina', 'Lewis', 'Comăneci', 'Owens', 'Blankers-Koen', 'Bolt', 'Fischer', 'Phelps', 'Bjørgen', 'Keino', 'Bjørndalen', 'Tani', 'Bikila', 'Kato', 'Otto', 'Mangiarotti', 'Biles', 'Thorpe', 'Stevenson', 'Čáslavská', 'Gebrselassie', 'Dæhlie', 'Yining', 'Quiroga', 'Gerevich']
+countries = [('USA', 'USA'), ('URS', 'Russia'), ('GER', 'Germany'), ('GDR', 'Germany'), ('GBR', 'UK'), ('FRA', 'France'), ('ITA', 'Italy'), ('SWE', 'Sweden'), ('CHN', 'China'), ('NOR', 'Norway'), ('HUN', 'Hungary'), ('JPN', 'Japan'), ('AUS', 'Australia'), ('FIN', 'Finland'), ('KEN', 'Kenya'), ('ETH', 'Ethiopia'), ('CUB', 'Cuba'), ('BRA', 'Brazil'), ('CAN', 'Canada'), ('ROU', 'Romania'), ('TCH', 'Czech Republic'), ('JAM', 'Jamaica')]
+summer_cities = ['Athina', 'Paris', 'London', 'Stockholm', 'Amsterdam', 'Los Angeles', 'Berlin', 'Helsinki', 'Roma', 'Tokyo', 'Mexico City', 'Munich', 'Montreal', 'Moskva', 'Seoul', 'Barcelona', 'Sydney', 'Beijing', 'Rio de Janeiro']
+winter_cities = ['Chamonix', 'Sankt Moritz', 'Lake Placid', 'Oslo', 'Cortina d\'Ampezzo', 'Squaw Valley', 'Innsbruck', 'Grenoble', 'Sapporo', 'Sarajevo', 'Calgary', 'Albertville', 'Lillehammer', 'Nagano', 'Salt Lake City', 'Torino', 'Vancouver', 'Sochi']
+summer_sports = ['Athletics', 'Swimming', 'Gymnastics', 'Rowing', 'Fencing', 'Cycling', 'Boxing', 'Wrestling', 'Judo', 'Sailing', 'Shooting', 'Weightlifting', 'Diving', 'Hockey', 'Football', 'Basketball']
+winter_sports = ['Alpine Skiing', 'Cross Country Skiing', 'Speed Skating', 'Figure Skating', 'Biathlon', 'Ice Hockey', 'Ski Jumping', 'Bobsleigh']
+event_names = ['100 metres', '200 metres', '400 metres', '1,500 metres', '10 kilometres', 'Individual', 'Team', 'Pairs', 'Relay', 'Lightweight', 'Heavyweight', 'All-Around']
+
+def main():
+    """Reads the command line and writes the synthetic data set."""
+    command_line_arguments = get_command_line_arguments()
+    with open(command_line_arguments.output, 'w', newline='') as athlete_events_file:
+        write_synthetic_athlete_events(athlete_events_file, command_line_arguments.rows, command_line_arguments.seed)
+    if command_line_arguments.regions:
+        with open(command_line_arguments.regions, 'w', newline='') as regions_file:
+            write_synthetic_noc_regions(regions_file)
+
+def get_command_line_arguments():
+    """Return parsed command line arguments made using argparse."""
+    parser = argparse.ArgumentParser(description='Writes a synthetic Olympics data set in the format of athlete_events.csv.')
+    parser.add_argument('output', help='the athlete_events csv file to write')
+    parser.add_argument('--rows', '-n', type=int, default=270000, help='the number of rows (athletes competing in an event) to write (default 270000, about the size of the real data set)')
+    parser.add_argument('--seed', '-s', type=int, default=257, help='the random seed, so the same data set can be written again (default 257)')
+    parser.add_argument('--regions', '-r', help='also write the noc_regions csv file, giving the country of each NOC, to this file')
+    return parser.parse_args()
+
+def write_synthetic_athlete_events(athlete_events_file, number_of_rows, seed):
+    """Writes the passed number of synthetic rows to the opened csv file. There is about one athlete for every four rows, each competing for one NOC in one or a few games and sports, and about one row in seven wins a medal."""
+    generator = random.Random(seed)
+    games = get_synthetic_games()
+    number_of_athletes = max(1, number_of_rows // 4)
+    writer = csv.writer(athlete_events_file)
+    writer.writerow(athlete_events_columns)
+    for row_number in range(number_of_rows):
+        athlete_id = generator.randint(1, number_of_athletes)
+        athlete_generator = random.Random(seed * 1000003 + athlete_id)
+        noc, country = athlete_generator.choice(countries)
+        year, season, city = games[(athlete_generator.randrange(len(games)) + generator.randrange(2) * 2) % len(games)]
+        sport = athlete_generator.choice(summer_sports if season == 'Summer' else winter_sports)
+        sex = athlete_generator.choice(['M', 'F'])
+        event = sport + ' ' + ("Men's" if sex == 'M' else "Women's") + ' ' + generator.choice(event_names)
+        medal = generator.choices(['NA', 'Gold', 'Silver', 'Bronze'], weights=[85, 5, 5, 5])[0]
+        name = athlete_generator.choice(first_names) + ' ' + athlete_generator.choice(last_names) + ' ' + str(athlete_id)
+        writer.writerow([athlete_id, name, sex, athlete_generator.randint(15, 40), 'NA', 'NA', country, noc, str(year) + ' ' + season, year, season, city, sport, event, medal])
+
+def get_synthetic_games():
+    """Returns the (year, season, city) of summer games every four years from 1896 and winter games every four years from 1924."""
+    games = [(year, 'Summer', summer_cities[number % len(summer_cities)]) for number, year in enumerate(range(1896, 2017, 4))]
+    games += [(year, 'Winter', winter_cities[number % len(winter_cities)]) for number, year in enumerate(range(1924, 2015, 4))]
+    return games
+
+def write_synthetic_noc_regions(regions_file):
+    """Writes the country of each synthetic NOC to the opened csv file, in the format of noc_regions.csv."""
+    writer = csv.writer(regions_file)
+    writer.writerow(['NOC', 'region', 'notes'])
+    for noc, country in countries:
+        writer.writerow([noc, country, ''])
+
+"""Executes the main program."""
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import io
+import sys
+import csv
+import time
+import argparse
+import psycopg2
+import olympics_queries
+from olympics_dataset import table_columns, read_olympics_dataset, print_progress
+from config import database, user, password
+
+"""Loads the Olympics data set (athlete_events.csv, and optionally noc_regions.csv for the NOCs' country names) into the tables that olympics.py and olympics-api.py query. The source file is read once, the athletes, NOCs, games, sports, events and medals are numbered in memory as they first appear, and every table is then written with COPY FROM STDIN from an in-memory buffer. Primary keys, the search indexes and the gold medal views are only created once all the rows are in. Run "load_olympics.py -h" for its options."""
+
+def main():
+    """Reads the command line, reads the data set and loads it into the database. Exits with status 1 if the database can't be reached or the load fails."""
+    command_line_arguments = get_command_line_arguments()
+    start_time = time.perf_counter()
+    tables = read_olympics_dataset(command_line_arguments.athlete_events, command_line_arguments.regions)
+    database_connection = get_connection()
+    if not database_connection or not load_tables(database_connection, tables):
+        print("Nothing was loaded.", file=sys.stderr)
+        sys.exit(1)
+    number_of_rows = sum(len(rows) for rows in tables.values())
+    seconds = time.perf_counter() - start_time
+    print("Loaded " + str(number_of_rows) + " rows in " + format(seconds, '.1f') + " s (" + format(number_of_rows / seconds, '.0f') + " rows/sec).", file=sys.stderr)
+
+def get_command_line_arguments():
+    """Return parsed command line arguments made using argparse."""
+    parser = argparse.ArgumentParser(description='Loads athlete_events.csv into the Olympics database, replacing its tables.')
+    parser.add_argument('athlete_events', help='the athlete_events.csv file of the data set')
+    parser.add_argument('--regions', '-r', help='the noc_regions.csv file of the data set, giving the country of each NOC (otherwise the first team name seen for each NOC is used)')
+    return parser.parse_args()
+
+def get_connection():
+    """Attempts to connect to a database with parameters passed from config.py, returns connection or prints error and returns null string if connection failed."""
+    connection = ""
+    try:
+        connection = psycopg2.connect(database=database, user=user, password=password)
+    except Exception as e:
+        print(e)
+    return connection
+
+def load_tables(database_connection, tables):
+    """Replaces the tables of the database with the passed ones in one transaction: drops them (and the views built on them), recreates them without any constraint, copies every row in, then adds the primary keys, the search indexes and the gold medal views and analyzes the tables. Returns True once the transaction is committed, or prints the error and returns False (leaving the tables as they were) if any step fails."""
+    cursor = database_connection.cursor()
+    try:
+        for table_name in table_columns:
+            cursor.execute('DROP TABLE IF EXISTS ' + table_name + ' CASCADE')
+            cursor.execute('CREATE TABLE ' + table_name + ' (' + ', '.join(column_name + ' ' + column_type for column_name, column_type in table_columns[table_name]) + ')')
+        for table_name in table_columns:
+            copy_table(cursor, table_name, tables[table_name])
+        start_time = time.perf_counter()
+        for table_name in table_columns:
+            if table_name != 'linking_table':
+                cursor.execute('ALTER TABLE ' + table_name + ' ADD PRIMARY KEY (id)')
+        for statement in olympics_queries.index_statements + olympics_queries.materialized_view_statements:
+            cursor.execute(statement)
+        cursor.execute('ANALYZE')
+        database_connection.commit()
+        print("Created the keys, indexes and views in " + format(time.perf_counter() - start_time, '.1f') + " s", file=sys.stderr)
+        return True
+    except Exception as e:
+        database_connection.rollback()
+        print(e)
+        return False
+
+def copy_table(cursor, table_name, rows):
+    """Writes the rows into an in-memory csv buffer and copies it into the table with COPY FROM STDIN."""
+    start_time = time.perf_counter()
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    column_names = ', '.join(column_name for column_name, column_type in table_columns[table_name])
+    cursor.copy_expert('COPY ' + table_name + ' (' + column_names + ') FROM STDIN WITH (FORMAT csv)', buffer)
+    print_progress('Copied ' + table_name + ':', len(rows), start_time)
+
+"""Executes the main program."""
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,15 @@
 #author: Kai Johnson
 
+import sys
+import time
+import queue
+import shlex
 import argparse
+import collections
+import concurrent.futures
 import psycopg2
+import psycopg2.errors
+import olympics_queries
 from config import database, user, password
 
 """Constructs a CLI enabling users to use 3 commands to view information for the database described in olympics.sql, as well as supporting a help command."""
@@ -11,22 +19,40 @@ def main():
     command_line_arguments = get_command_line_arguments()
     if need_help(command_line_arguments):
         print_usage_txt()
+    elif command_line_arguments.optimizeDatabase:
+        optimize_database(command_line_arguments)
+    elif command_line_arguments.refreshViews:
+        refresh_materialized_views()
+    elif command_line_arguments.session or command_line_arguments.batchFile:
+        run_session(command_line_arguments)
     else:
-        search_results = get_search_results(command_line_arguments)
+        profile = {'phase_times': {}, 'plan': None}
+        search_results = get_search_results(command_line_arguments, profile)
+        phase_start_time = time.perf_counter()
         print_search_results(search_results, command_line_arguments)
+        profile['phase_times']['print'] = time.perf_counter() - phase_start_time
+        if command_line_arguments.profile:
+            print_profile(profile, search_results)
 
-def get_command_line_arguments():
-	"""Return parsed command line arguments made using argparse."""
+def get_command_line_arguments(arguments=None):
+	"""Return parsed command line arguments made using argparse, from the passed list of arguments (a command of a session) or else from the command line."""
 	parser = argparse.ArgumentParser(add_help=False)
 	parser.add_argument("--help", "-h", action="store_true")
 	parser.add_argument("--listAthletesFromNOC", "-lan", help = 'Lists all the athletes from an NOC specified by its abbreviation.')
 	parser.add_argument("--listGoldMedalsOfNOCs", "-lmn", action="store_true")
 	parser.add_argument("--listTopAthletesOfSport", "-las", help = 'Lists the athletes of the specified sport in descending order of their gold medal count')
-	return parser.parse_args()
+	parser.add_argument("--profile", "-p", nargs="?", const="timings", choices=["timings", "explain"], help = 'Prints how long each phase of the search took, and with "explain" the query plan from EXPLAIN ANALYZE.')
+	parser.add_argument("--optimizeDatabase", "-od", action="store_true", help = 'Creates the indexes and gold medal views the searches use and prints their timings before and after.')
+	parser.add_argument("--refreshViews", "-rv", action="store_true", help = 'Recomputes the gold medal views after the data has changed.')
+	parser.add_argument("--engine", "-e", help = 'Answers the search from this snapshot (built by olympics_engine.py) with the embedded engine instead of the database.')
+	parser.add_argument("--session", "-s", action="store_true", help = 'Reads search commands, one per line, from the standard input and answers them all over the same connection.')
+	parser.add_argument("--batchFile", "-bf", help = 'Like --session, but reads the search commands from this file.')
+	parser.add_argument("--workers", "-w", type=int, default=1, help = 'With --session or --batchFile, how many searches run at once, each on its own connection (default 1).')
+	return parser.parse_args(arguments)
 
 def need_help(command_line_arguments):
 	"""This method returns true if '-h, --help, help' is entered in the command line argument or if there is no argument entered. Otherwise, returns false."""
-	has_argument = command_line_arguments.listAthletesFromNOC or command_line_arguments.listGoldMedalsOfNOCs or command_line_arguments.listTopAthletesOfSport
+	has_argument = command_line_arguments.listAthletesFromNOC or command_line_arguments.listGoldMedalsOfNOCs or command_line_arguments.listTopAthletesOfSport or command_line_arguments.optimizeDatabase or command_line_arguments.refreshViews or command_line_arguments.session or command_line_arguments.batchFile
 	if command_line_arguments.help or not has_argument:
 		return True
 	return False
@@ -37,24 +63,42 @@ def print_usage_txt():
 		print(line, end="")
 	print()
 
-def get_search_results(command_line_arguments):
-    """Connects to the database, retrieves the argument-specific SQL query and  search-string, and retrieves then returns the cursor result of the query"""
-    database_connection = get_connection()
+def get_search_results(command_line_arguments, profile=None, database_connection=None, raise_errors=False):
+    """Connects to the database (unless an open connection is passed), retrieves the argument-specific query and  search-string, and retrieves then returns the rows resulting from the query. If a profile dictionary is passed, the time spent connecting, running the query and fetching its rows is recorded in its 'phase_times', and if --profile explain was given the query plan is recorded in its 'plan'. With raise_errors, a failed query raises its error instead of printing it."""
+    if profile is None:
+        profile = {'phase_times': {}, 'plan': None}
+    if database_connection is None:
+        phase_start_time = time.perf_counter()
+        database_connection = get_connection(command_line_arguments.engine)
+        profile['phase_times']['connect'] = time.perf_counter() - phase_start_time
     if database_connection:
         cursor_parameters = get_cursor_parameters(command_line_arguments)
-        return get_cursor(database_connection, cursor_parameters)
+        phase_start_time = time.perf_counter()
+        cursor = get_cursor(database_connection, cursor_parameters, raise_errors)
+        profile['phase_times']['query'] = time.perf_counter() - phase_start_time
+        if cursor is None:
+            return None
+        phase_start_time = time.perf_counter()
+        search_results = cursor.fetchall()
+        profile['phase_times']['fetch'] = time.perf_counter() - phase_start_time
+        if command_line_arguments.profile == 'explain':
+            profile['plan'] = get_query_plan(database_connection, cursor_parameters)
+        return search_results
 
-def get_connection():
-    """Attempts to connect to a database with parameters passed from config.py, returns connection or prints error and returns null string if connection failed."""
+def get_connection(engine_snapshot=None):
+    """Attempts to connect to a database with parameters passed from config.py, returns connection or prints error and returns null string if connection failed. If the path of an engine snapshot is passed, connects to the embedded engine (see olympics_engine.py) loaded from it instead."""
     connection = ""
     try:
+        if engine_snapshot:
+            import olympics_engine
+            return olympics_engine.OlympicsEngine(engine_snapshot).connect()
         connection = psycopg2.connect(database=database, user=user, password=password)
     except Exception as e:
         print(e)
     return connection
 
 def get_cursor_parameters(command_line_arguments):
-    """Depending on the command line arguments, returns a list with position 0 as the SQL query and position 1 as the search string if it exists."""
+    """Depending on the command line arguments, returns a list with position 0 as the name of the query (see olympics_queries.py) and position 1 as the search string if it exists."""
     if command_line_arguments.listAthletesFromNOC:
         return get_lan_cursor_parameters(command_line_arguments.listAthletesFromNOC)
     elif command_line_arguments.listGoldMedalsOfNOCs:
@@ -64,77 +108,214 @@ def get_cursor_parameters(command_line_arguments):
     return None
 
 def get_lan_cursor_parameters(noc_name):
-    """Returns list with position 0 as a SQL query to find all athletes from a specified NOC and position 1 as the search string description of the specified NOC's abbreviation."""
+    """Returns list with position 0 as the query to find all athletes from a specified NOC and position 1 as the search string description of the specified NOC's abbreviation."""
     search_string = noc_name
-    query = '''SELECT DISTINCT
-        athletes.full_name
-    FROM
-        athletes,
-        linking_table,
-        national_olympic_committees
-    WHERE
-        linking_table.national_olympic_committee_id = national_olympic_committees.id AND
-        national_olympic_committees.abbreviation = %s AND
-        linking_table.athlete_id = athletes.id
-    ORDER BY
-        athletes.full_name'''
-    return [query, search_string]
+    return ['lan', search_string]
 
 def get_lmn_cursor_parameters():
-    """Returns list with position 0 as the SQL query to find the gold medal counts of all the NOCs in the database and display them in descending order of gold medals."""
-    query = '''SELECT
-      national_olympic_committees.country,
-      COUNT(linking_table.medal_id) AS gold_medals
-    FROM
-      national_olympic_committees
-    LEFT JOIN
-      linking_table
-    ON
-      linking_table.national_olympic_committee_id = national_olympic_committees.id
-      AND
-      linking_table.medal_id = '2'
-    GROUP BY
-      national_olympic_committees.country
-    ORDER BY
-      gold_medals DESC'''
-    return [query]
+    """Returns list with position 0 as the query to find the gold medal counts of all the NOCs in the database and display them in descending order of gold medals."""
+    return ['lmn']
 
 def get_las_cursor_parameters(sport_name):
-    """Returns list with position 0 as the SQL query to find the gold medal counts of all athletes who have participated in a specified sport, sorted by number of gold medals, and position 1 as the search string describing the specified sport."""
+    """Returns list with position 0 as the query to find the gold medal counts of all athletes who have participated in a specified sport, sorted by number of gold medals, and position 1 as the search string describing the specified sport."""
     search_string = sport_name
-    query = '''SELECT
-      athletes.full_name,
-      COUNT(*) AS gold_medals
-    FROM
-      sports,
-      athletes,
-      linking_table,
-      medals
-    WHERE
-      linking_table.sport_id = sports.id AND
-      sports.sport = %s AND
-      linking_table.medal_id = medals.id AND
-      medals.medal = 'Gold' AND
-      linking_table.athlete_id = athletes.id
-    GROUP BY
-      athletes.full_name
-    ORDER BY
-      gold_medals DESC'''
-    return [query, search_string]
-
-def get_cursor(database_connection, cursor_parameters):
-    """Execute the passed SQL query with search string string if one exists and returns the resulting cursor object."""
+    return ['las', search_string]
+
+def get_cursor(database_connection, cursor_parameters, raise_errors=False):
+    """Execute the passed query (prepared on the connection) with search string string if one exists and returns the resulting cursor object, or prints the error and returns None if it failed (raises the error instead with raise_errors). If the query reads a gold medal view that hasn't been created yet (see --optimizeDatabase), its fallback query on linking_table is run instead."""
     try:
         cursor = database_connection.cursor()
-        if len(cursor_parameters) == 2:
-            cursor.execute(cursor_parameters[0], (cursor_parameters[1],))
-        elif len(cursor_parameters) == 1:
-            cursor.execute(cursor_parameters[0])
+        olympics_queries.execute_query(cursor, cursor_parameters[0], cursor_parameters[1:])
         return cursor
     except Exception as e:
+        fallback_query_name = olympics_queries.queries[cursor_parameters[0]].get('fallback')
+        if isinstance(e, psycopg2.errors.UndefinedTable) and fallback_query_name:
+            database_connection.rollback()
+            return get_cursor(database_connection, [fallback_query_name] + list(cursor_parameters[1:]), raise_errors)
+        if raise_errors:
+            raise
         print(e)
         return None
 
+def run_session(command_line_arguments):
+    """Runs the search commands read one per line from the batch file, or from the standard input, over connections opened once for the whole session, so each query is only prepared once per connection. With --workers, that many searches run at once, each on its own connection, while the results are still printed in the order of the commands. Typed at a terminal, each command is answered before the next one is read; "quit" or "exit" ends the session."""
+    command_file = open(command_line_arguments.batchFile) if command_line_arguments.batchFile else sys.stdin
+    interactive = command_file.isatty()
+    database_connections = get_session_connections(command_line_arguments.engine, max(1, command_line_arguments.workers))
+    if not database_connections:
+        return
+    free_connections = queue.Queue()
+    for database_connection in database_connections:
+        free_connections.put(database_connection)
+    largest_number_of_pending_commands = 1 if interactive else len(database_connections) * 4
+    pending_commands = collections.deque()
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(database_connections)) as executor:
+            for line in read_session_lines(command_file, interactive):
+                if line in ('quit', 'exit'):
+                    break
+                session_arguments, error_message = get_session_arguments(line)
+                future = None
+                if error_message is None and not need_help(session_arguments):
+                    future = executor.submit(run_session_search, session_arguments, free_connections)
+                pending_commands.append((session_arguments, error_message, future))
+                while len(pending_commands) >= largest_number_of_pending_commands:
+                    print_session_command(*pending_commands.popleft())
+            while pending_commands:
+                print_session_command(*pending_commands.popleft())
+    finally:
+        for database_connection in set(database_connections):
+            database_connection.close()
+        if command_file is not sys.stdin:
+            command_file.close()
+
+def get_session_connections(engine_snapshot, number_of_connections):
+    """Returns a list of the passed number of connections to the database (fewer if some fail), or of the same connection to the embedded engine, which can run searches at once on its own."""
+    first_connection = get_connection(engine_snapshot)
+    if not first_connection:
+        return []
+    if getattr(first_connection, 'is_embedded_engine', False):
+        return [first_connection] * number_of_connections
+    database_connections = [first_connection]
+    for i in range(number_of_connections - 1):
+        database_connection = get_connection()
+        if database_connection:
+            database_connections.append(database_connection)
+    return database_connections
+
+def read_session_lines(command_file, interactive):
+    """Yields the stripped lines of the command file, skipping blank lines and comments (starting with #), and prompting for each one at a terminal."""
+    while True:
+        if interactive:
+            print("olympics> ", end="", file=sys.stderr, flush=True)
+        line = command_file.readline()
+        if not line:
+            return
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+def get_session_arguments(line):
+    """Parses a command of the session with the same arguments as the command line and returns the (parsed arguments, None), or (None, an error message) if the command can't be run in a session."""
+    try:
+        session_arguments = get_command_line_arguments(shlex.split(line))
+    except (ValueError, SystemExit):
+        return None, "Could not read the command: " + line
+    if session_arguments.optimizeDatabase or session_arguments.refreshViews or session_arguments.session or session_arguments.batchFile:
+        return None, "Only searches (-lan, -lmn, -las) can be run in a session: " + line
+    return session_arguments, None
+
+def run_session_search(session_arguments, free_connections):
+    """Runs the search of a session command on a connection taken from the queue of free connections, ending its transaction afterwards (even if the search failed) so the connection is ready for the next search, and returns the search results and the profile of the search. A failed search raises its error, so it is printed by print_session_command in the order of the commands rather than from the worker thread."""
+    database_connection = free_connections.get()
+    try:
+        profile = {'phase_times': {}, 'plan': None}
+        return get_search_results(session_arguments, profile, database_connection, raise_errors=True), profile
+    finally:
+        database_connection.rollback()
+        free_connections.put(database_connection)
+
+def print_session_command(session_arguments, error_message, future):
+    """Prints the results of a session command (waiting for its search to finish), its error message (or the error its search raised), or usage.txt if it asked for help, followed by a blank line."""
+    if error_message is not None:
+        print(error_message)
+    elif future is None:
+        print_usage_txt()
+    else:
+        try:
+            search_results, profile = future.result()
+        except Exception as e:
+            print(e)
+            search_results = None
+        if search_results is not None:
+            phase_start_time = time.perf_counter()
+            print_search_results(search_results, session_arguments)
+            profile['phase_times']['print'] = time.perf_counter() - phase_start_time
+            if session_arguments.profile:
+                print_profile(profile, search_results)
+    print()
+
+def optimize_database(command_line_arguments):
+    """Creates the indexes on linking_table and its dimension tables and the materialized views of gold medal counts (see olympics_queries.py) that the searches use, then prints how long the -lan, -lmn and -las queries took to run, according to EXPLAIN ANALYZE, before and after. The -lan and -las arguments, if given, choose the NOC and sport the queries are timed with."""
+    database_connection = get_connection()
+    if not database_connection:
+        return
+    noc_name = command_line_arguments.listAthletesFromNOC or 'USA'
+    sport_name = command_line_arguments.listTopAthletesOfSport or 'Swimming'
+    timed_searches = [
+        ('-lan ' + noc_name, ['lan', noc_name], ['lan', noc_name]),
+        ('-lmn', ['lmn_from_linking_table'], ['lmn']),
+        ('-las ' + sport_name, ['las_from_linking_table', sport_name], ['las', sport_name]),
+    ]
+    try:
+        times_before = [get_execution_time(database_connection, cursor_parameters_before) for search, cursor_parameters_before, cursor_parameters_after in timed_searches]
+        cursor = database_connection.cursor()
+        for statement in olympics_queries.index_statements + olympics_queries.materialized_view_statements:
+            cursor.execute(statement)
+        cursor.execute('ANALYZE')
+        database_connection.commit()
+        times_after = [get_execution_time(database_connection, cursor_parameters_after) for search, cursor_parameters_before, cursor_parameters_after in timed_searches]
+    except Exception as e:
+        print(e)
+        return
+    print("Created the indexes and gold medal views. Query times according to EXPLAIN ANALYZE:\n\nBefore (ms) | After (ms) | Search\n================")
+    for i in range(len(timed_searches)):
+        print(format(times_before[i], '11.3f') + " | " + format(times_after[i], '10.3f') + " | " + timed_searches[i][0])
+
+def get_execution_time(database_connection, cursor_parameters):
+    """Runs the passed query under EXPLAIN ANALYZE and returns the execution time Postgres reports, in milliseconds."""
+    cursor = database_connection.cursor()
+    query = olympics_queries.queries[cursor_parameters[0]]['sql']
+    cursor.execute('EXPLAIN (ANALYZE, FORMAT JSON) ' + query, tuple(cursor_parameters[1:]))
+    plan = cursor.fetchone()[0]
+    database_connection.rollback()
+    return plan[0]['Execution Time']
+
+def refresh_materialized_views():
+    """Recomputes the materialized views of gold medal counts from linking_table, without blocking searches reading them meanwhile, and prints whether it worked."""
+    database_connection = get_connection()
+    if not database_connection:
+        return
+    try:
+        cursor = database_connection.cursor()
+        for statement in olympics_queries.refresh_statements:
+            cursor.execute(statement)
+        database_connection.commit()
+    except Exception as e:
+        print(e)
+        print("The gold medal views could not be refreshed, create them first with --optimizeDatabase.")
+        return
+    print("Refreshed the gold medal views.")
+
+def get_query_plan(database_connection, cursor_parameters):
+    """Returns the lines of the plan EXPLAIN ANALYZE gives for the passed query, or for its fallback if it reads a gold medal view that hasn't been created."""
+    if getattr(database_connection, 'is_embedded_engine', False):
+        return ["The embedded engine has no query plan, EXPLAIN ANALYZE needs the database."]
+    database_connection.rollback()
+    query = olympics_queries.queries[cursor_parameters[0]]
+    try:
+        cursor = database_connection.cursor()
+        cursor.execute('EXPLAIN (ANALYZE, BUFFERS) ' + query['sql'], tuple(cursor_parameters[1:]))
+        return [row[0] for row in cursor]
+    except Exception as e:
+        if isinstance(e, psycopg2.errors.UndefinedTable) and query.get('fallback'):
+            return get_query_plan(database_connection, [query['fallback']] + list(cursor_parameters[1:]))
+        return [str(e)]
+    finally:
+        database_connection.rollback()
+
+def print_profile(profile, search_results):
+    """Prints how long each phase of the search took, in milliseconds, the number of rows it found and, if recorded, the query plan."""
+    print("\nProfile of the search (" + str(len(search_results or [])) + " rows):\n\nTime (ms) | Phase\n================")
+    for phase in ['connect', 'query', 'fetch', 'print']:
+        if phase in profile['phase_times']:
+            print(format(profile['phase_times'][phase] * 1000, '9.3f') + " | " + phase)
+    print(format(sum(profile['phase_times'].values()) * 1000, '9.3f') + " | total")
+    if profile['plan']:
+        print("\nQuery plan (EXPLAIN ANALYZE):\n================")
+        for line in profile['plan']:
+            print(line)
+
 def print_search_results(search_results, command_line_arguments):
     """Prints the search results of the user's search to the console."""
     header = get_header_text(command_line_arguments)
@@ -0,0 +1,69 @@
+import sys
+import csv
+import time
+
+"""Reads the Olympics data set (athlete_events.csv, and optionally noc_regions.csv for the NOCs' country names) into the rows of the tables that olympics.py and olympics-api.py query, numbering the athletes, NOCs, games, sports, events and medals in memory as they first appear. It has no database imports, so olympics_engine.py can build a snapshot straight from the data set without psycopg2 or a config.py; load_olympics.py uses it to read the data set before copying it into the database."""
+
+table_columns = {
+    'athletes': [('id', 'integer'), ('name', 'text'), ('full_name', 'text'), ('sex', 'text')],
+    'national_olympic_committees': [('id', 'integer'), ('abbreviation', 'text'), ('country', 'text')],
+    'olympic_games': [('id', 'integer'), ('year', 'integer'), ('season', 'text'), ('city', 'text')],
+    'sports': [('id', 'integer'), ('sport', 'text')],
+    'events': [('id', 'integer'), ('event_title', 'text')],
+    'medals': [('id', 'integer'), ('medal', 'text')],
+    'linking_table': [('athlete_id', 'integer'), ('national_olympic_committee_id', 'integer'), ('olympic_game_id', 'integer'), ('sport_id', 'integer'), ('event_id', 'integer'), ('medal_id', 'integer')],
+}
+
+medal_ids = {'NA': 1, 'Gold': 2, 'Silver': 3, 'Bronze': 4}
+
+progress_interval = 50000
+
+def read_olympics_dataset(athlete_events_file_name, regions_file_name=None):
+    """Reads the data set once and returns a dictionary from each table name to its list of rows, with the columns in the order of table_columns. Each distinct NOC, games, sport and event gets the next id the first time it appears; athletes keep the ids of the data set and medals have fixed ids (Gold is 2)."""
+    dictionary_of_countries = read_noc_countries(regions_file_name) if regions_file_name else {}
+    athletes = {}
+    noc_ids = {}; noc_countries = {}
+    games_ids = {}
+    sport_ids = {}
+    event_ids = {}
+    linking_rows = []
+    start_time = time.perf_counter()
+    with open(athlete_events_file_name, newline='') as athlete_events_file:
+        for row in csv.DictReader(athlete_events_file):
+            athlete_id = int(row['ID'])
+            if athlete_id not in athletes:
+                athletes[athlete_id] = (athlete_id, row['Name'], row['Name'], row['Sex'])
+            noc_id = get_id(noc_ids, row['NOC'])
+            noc_countries.setdefault(row['NOC'], dictionary_of_countries.get(row['NOC']) or row['Team'])
+            games_id = get_id(games_ids, (int(row['Year']), row['Season'], row['City']))
+            sport_id = get_id(sport_ids, row['Sport'])
+            event_id = get_id(event_ids, row['Event'])
+            linking_rows.append((athlete_id, noc_id, games_id, sport_id, event_id, medal_ids.get(row['Medal'], medal_ids['NA'])))
+            if len(linking_rows) % progress_interval == 0:
+                print_progress('Read', len(linking_rows), start_time)
+    print_progress('Read', len(linking_rows), start_time)
+    return {
+        'athletes': list(athletes.values()),
+        'national_olympic_committees': [(noc_id, abbreviation, noc_countries[abbreviation]) for abbreviation, noc_id in noc_ids.items()],
+        'olympic_games': [(games_id,) + games for games, games_id in games_ids.items()],
+        'sports': [(sport_id, sport) for sport, sport_id in sport_ids.items()],
+        'events': [(event_id, event_title) for event_title, event_id in event_ids.items()],
+        'medals': [(medal_id, medal) for medal, medal_id in medal_ids.items()],
+        'linking_table': linking_rows,
+    }
+
+def read_noc_countries(regions_file_name):
+    """Returns a dictionary from each NOC abbreviation in noc_regions.csv to its country."""
+    with open(regions_file_name, newline='') as regions_file:
+        return {row['NOC']: row['region'] for row in csv.DictReader(regions_file) if row['region']}
+
+def get_id(dictionary_of_ids, key):
+    """Returns the id of the key, giving it the next id if it hasn't been seen before."""
+    if key not in dictionary_of_ids:
+        dictionary_of_ids[key] = len(dictionary_of_ids) + 1
+    return dictionary_of_ids[key]
+
+def print_progress(verb, number_of_rows, start_time):
+    """Prints how many rows have been handled so far and how fast."""
+    seconds = max(time.perf_counter() - start_time, 1e-9)
+    print(verb + " " + str(number_of_rows) + " rows (" + format(number_of_rows / seconds, '.0f') + " rows/sec)", file=sys.stderr)
@@ -0,0 +1,319 @@
+import os
+import sys
+import glob
+import argparse
+import numpy
+import olympics_dataset
+
+"""An embedded, read-only stand-in for the Postgres database that answers the named queries of olympics_queries.py (nocs, games, the medalists queries, lan, lmn and las) from a snapshot of the tables, without a database server. The snapshot is a directory of NumPy arrays, one per column, which are memory-mapped when loaded; the columns of linking_table hold the row numbers of the athletes, NOCs, games, sports, events and medals they refer to, so the queries are answered with vectorized filters, gathers and bincount-style counting. The rows returned are the same as Postgres returns, in the order the SQL asks for (text is ordered by code point, as under the "C" collation the SQL asks for, and NULL comes last). Run "olympics_engine.py -h" to build a snapshot from the database or straight from athlete_events.csv."""
+
+def main():
+    """Reads the command line and builds a snapshot from the database or from the data set files."""
+    command_line_arguments = get_command_line_arguments()
+    if command_line_arguments.csv:
+        tables = olympics_dataset.read_olympics_dataset(command_line_arguments.csv, command_line_arguments.regions)
+    else:
+        import load_olympics
+        database_connection = load_olympics.get_connection()
+        if not database_connection:
+            return
+        tables = read_database_tables(database_connection)
+    build_snapshot(tables, command_line_arguments.snapshot)
+    print("Wrote the snapshot to " + command_line_arguments.snapshot, file=sys.stderr)
+
+def get_command_line_arguments():
+    """Return parsed command line arguments made using argparse."""
+    parser = argparse.ArgumentParser(description='Builds a snapshot of the Olympics tables for the embedded engine (used by olympics.py and olympics-api.py with --engine).')
+    parser.add_argument('snapshot', help='the directory to write the snapshot to')
+    parser.add_argument('--csv', help='build the snapshot from this athlete_events.csv instead of from the database')
+    parser.add_argument('--regions', '-r', help='the noc_regions.csv giving the country of each NOC, with --csv')
+    return parser.parse_args()
+
+def read_database_tables(database_connection):
+    """Returns a dictionary from each table name to the list of its rows read from the database, with the columns in the order of olympics_dataset.table_columns."""
+    tables = {}
+    cursor = database_connection.cursor()
+    for table_name, columns in olympics_dataset.table_columns.items():
+        cursor.execute('SELECT ' + ', '.join(column_name for column_name, column_type in columns) + ' FROM ' + table_name)
+        tables[table_name] = cursor.fetchall()
+    return tables
+
+def build_snapshot(tables, snapshot_directory):
+    """Writes the tables to the snapshot directory as one .npy file per column. The dimension tables are sorted by id; a column holding NULL is written with empty text (or 0) in their place and a 'table.column.null' mask of where they are, and each column of linking_table is written as the row numbers of the rows it refers to (-1 where there is none)."""
+    os.makedirs(snapshot_directory, exist_ok=True)
+    dimension_ids = {}
+    for table_name, columns in olympics_dataset.table_columns.items():
+        if table_name == 'linking_table':
+            continue
+        rows = sorted(tables[table_name], key=lambda row: row[0])
+        for column_number, (column_name, column_type) in enumerate(columns):
+            values = [row[column_number] for row in rows]
+            null_mask = numpy.array([value is None for value in values], dtype=bool)
+            if column_type == 'integer':
+                column = numpy.array([0 if value is None else value for value in values], dtype=numpy.int64)
+            else:
+                column = numpy.array(['' if value is None else value for value in values], dtype=str)
+            save_column(snapshot_directory, table_name + '.' + column_name, column)
+            if null_mask.any():
+                save_column(snapshot_directory, table_name + '.' + column_name + '.null', null_mask)
+        dimension_ids[table_name] = numpy.array([row[0] for row in rows], dtype=numpy.int64)
+    linking_rows = tables['linking_table']
+    for column_number, (column_name, dimension_table_name) in enumerate(get_linking_columns()):
+        ids = numpy.array([-1 if row[column_number] is None else row[column_number] for row in linking_rows], dtype=numpy.int64)
+        save_column(snapshot_directory, 'linking_table.' + column_name, get_row_numbers(dimension_ids[dimension_table_name], ids))
+
+def get_linking_columns():
+    """Returns the (column name, table referred to) of each column of linking_table, in order."""
+    return [
+        ('athlete_id', 'athletes'),
+        ('national_olympic_committee_id', 'national_olympic_committees'),
+        ('olympic_game_id', 'olympic_games'),
+        ('sport_id', 'sports'),
+        ('event_id', 'events'),
+        ('medal_id', 'medals'),
+    ]
+
+def get_row_numbers(sorted_ids, ids):
+    """Returns the row numbers in the sorted ids of the passed ids, with -1 for the ids that aren't there."""
+    row_numbers = numpy.searchsorted(sorted_ids, ids)
+    found = row_numbers < len(sorted_ids)
+    found[found] = sorted_ids[row_numbers[found]] == ids[found]
+    return numpy.where(found, row_numbers, -1).astype(numpy.int32)
+
+def save_column(snapshot_directory, column_name, column):
+    """Writes one column of the snapshot."""
+    numpy.save(os.path.join(snapshot_directory, column_name + '.npy'), column)
+
+def get_text_sort_key(text):
+    """Returns the key that sorts text by code point with NULL (None) last, as ORDER BY under the "C" collation does."""
+    return (text is None, text or '')
+
+class OlympicsEngine:
+    """The memory-mapped columns of a snapshot and the queries answered from them."""
+
+    is_embedded_engine = True
+
+    def __init__(self, snapshot_directory):
+        self.columns = {}
+        for file_name in glob.glob(os.path.join(snapshot_directory, '*.npy')):
+            self.columns[os.path.basename(file_name)[:-len('.npy')]] = numpy.load(file_name, mmap_mode='r')
+        if 'linking_table.athlete_id' not in self.columns:
+            raise FileNotFoundError('No Olympics snapshot in ' + snapshot_directory)
+
+    def connect(self):
+        """Returns a connection-like object whose cursors run queries on this engine."""
+        return EngineConnection(self)
+
+    def execute(self, query_name, parameters):
+        """Returns the list of rows of the named query of olympics_queries.py run with the passed parameters."""
+        if query_name == 'nocs':
+            return self.get_nocs()
+        elif query_name == 'games':
+            return self.get_games()
+        elif query_name == 'medalists':
+            return self.get_medalists([int(parameters[0])], None, int(parameters[1]), False)
+        elif query_name == 'medalists_by_noc':
+            return self.get_medalists([int(parameters[0])], [parameters[1]], int(parameters[2]), False)
+        elif query_name == 'medalists_batch':
+            return self.get_medalists([int(games_id) for games_id in parameters[0]], None, None, True)
+        elif query_name == 'medalists_batch_by_noc':
+            return self.get_medalists([int(games_id) for games_id in parameters[0]], list(parameters[1]), None, True)
+        elif query_name == 'lan':
+            return self.get_athletes_from_noc(parameters[0])
+        elif query_name in ('lmn', 'lmn_from_linking_table'):
+            return self.get_gold_medals_of_nocs()
+        elif query_name in ('las', 'las_from_linking_table'):
+            return self.get_top_athletes_of_sport(parameters[0])
+        raise ValueError('The embedded engine does not support the query ' + query_name)
+
+    def linking_column(self, column_name):
+        """Returns the row numbers held by the passed column of linking_table."""
+        return self.columns['linking_table.' + column_name]
+
+    def gather(self, column_name, row_numbers):
+        """Returns the values of the column (named 'table.column') at the passed row numbers, as Python values (None where they are NULL)."""
+        values = self.columns[column_name][row_numbers].tolist()
+        if column_name + '.null' in self.columns:
+            for index in numpy.nonzero(self.columns[column_name + '.null'][row_numbers])[0].tolist():
+                values[index] = None
+        return values
+
+    def is_null(self, column_name):
+        """Returns the mask of the rows of the column (named 'table.column') that are NULL."""
+        if column_name + '.null' in self.columns:
+            return numpy.asarray(self.columns[column_name + '.null'])
+        return numpy.zeros(len(self.columns[column_name]), dtype=bool)
+
+    def where(self, column_name, value_mask):
+        """Returns the passed mask of the values of the column (named 'table.column') without its NULL rows, as an SQL comparison of NULL is never true."""
+        return value_mask & ~self.is_null(column_name)
+
+    def group(self, column_name, row_numbers):
+        """Returns the distinct values of the column (named 'table.column') at the passed row numbers, in code point order with NULL last, and how many times each appears, as an SQL GROUP BY on it does."""
+        null_mask = self.is_null(column_name)[row_numbers]
+        values, counts = numpy.unique(self.columns[column_name][row_numbers][~null_mask], return_counts=True)
+        values = values.tolist()
+        counts = counts.tolist()
+        if null_mask.any():
+            values.append(None)
+            counts.append(int(null_mask.sum()))
+        return values, counts
+
+    def joined(self, *column_names):
+        """Returns the mask of the rows of linking_table whose passed columns all refer to an existing row, as an inner join on them requires."""
+        mask = numpy.ones(len(self.linking_column('athlete_id')), dtype=bool)
+        for column_name in column_names:
+            mask &= self.linking_column(column_name) >= 0
+        return mask
+
+    def refers_to(self, linking_column_name, dimension_mask):
+        """Returns the mask of the rows of linking_table whose passed column refers to a row of the dimension table selected by the passed mask."""
+        row_numbers = self.linking_column(linking_column_name)
+        return (row_numbers >= 0) & numpy.asarray(dimension_mask)[row_numbers]
+
+    def get_nocs(self):
+        """Returns the distinct (abbreviation, country) of the NOCs ordered by abbreviation."""
+        all_rows = numpy.arange(len(self.columns['national_olympic_committees.id']))
+        nocs = set(zip(self.gather('national_olympic_committees.abbreviation', all_rows), self.gather('national_olympic_committees.country', all_rows)))
+        return sorted(nocs, key=lambda noc: get_text_sort_key(noc[0]) + get_text_sort_key(noc[1]))
+
+    def get_games(self):
+        """Returns the (id, year, season, city) of the games ordered by year."""
+        order = numpy.lexsort((self.columns['olympic_games.id'], self.columns['olympic_games.year'], self.is_null('olympic_games.year')))
+        return list(zip(*(self.gather('olympic_games.' + column_name, order) for column_name in ['id', 'year', 'season', 'city'])))
+
+    def get_medalists(self, list_of_games_ids, list_of_noc_abbreviations, after, with_games_and_noc):
+        """Returns the (athlete id, name, sex, sport, event title, medal) of every medal that isn't 'NA' won at the passed games, by athletes with ids above `after` (if not None) and from the passed NOCs (if not None), ordered by athlete, event and medal id. With with_games_and_noc, each row starts with the games id and NOC abbreviation and the rows are ordered by those first."""
+        joined_columns = ['athlete_id', 'olympic_game_id', 'sport_id', 'event_id', 'medal_id']
+        if with_games_and_noc or list_of_noc_abbreviations is not None:
+            joined_columns.append('national_olympic_committee_id')
+        mask = self.joined(*joined_columns)
+        mask &= self.refers_to('olympic_game_id', numpy.isin(self.columns['olympic_games.id'], list_of_games_ids))
+        mask &= self.refers_to('medal_id', self.where('medals.medal', self.columns['medals.medal'] != 'NA'))
+        if list_of_noc_abbreviations is not None:
+            mask &= self.refers_to('national_olympic_committee_id', self.where('national_olympic_committees.abbreviation', numpy.isin(self.columns['national_olympic_committees.abbreviation'], list_of_noc_abbreviations)))
+        if after is not None:
+            mask &= self.refers_to('athlete_id', self.columns['athletes.id'] > after)
+        link_rows = numpy.nonzero(mask)[0]
+        athletes = self.linking_column('athlete_id')[link_rows]
+        events = self.linking_column('event_id')[link_rows]
+        sort_keys = [self.columns['medals.id'][self.linking_column('medal_id')[link_rows]], self.columns['events.id'][events], self.columns['athletes.id'][athletes]]
+        if with_games_and_noc:
+            nocs = self.linking_column('national_olympic_committee_id')[link_rows]
+            games = self.linking_column('olympic_game_id')[link_rows]
+            sort_keys += [self.columns['national_olympic_committees.abbreviation'][nocs], self.is_null('national_olympic_committees.abbreviation')[nocs], self.columns['olympic_games.id'][games]]
+        order = numpy.lexsort(sort_keys)
+        athletes = athletes[order]
+        link_rows = link_rows[order]
+        row_columns = [
+            self.gather('athletes.id', athletes),
+            self.gather('athletes.name', athletes),
+            self.gather('athletes.sex', athletes),
+            self.gather('sports.sport', self.linking_column('sport_id')[link_rows]),
+            self.gather('events.event_title', self.linking_column('event_id')[link_rows]),
+            self.gather('medals.medal', self.linking_column('medal_id')[link_rows]),
+        ]
+        if with_games_and_noc:
+            row_columns = [
+                self.gather('olympic_games.id', self.linking_column('olympic_game_id')[link_rows]),
+                self.gather('national_olympic_committees.abbreviation', self.linking_column('national_olympic_committee_id')[link_rows]),
+            ] + row_columns
+        return list(zip(*row_columns))
+
+    def get_athletes_from_noc(self, noc_abbreviation):
+        """Returns the distinct full names, as 1-tuples, of the athletes who competed for the NOC with the passed abbreviation, in alphabetical order."""
+        mask = self.joined('athlete_id', 'national_olympic_committee_id')
+        mask &= self.refers_to('national_olympic_committee_id', self.where('national_olympic_committees.abbreviation', self.columns['national_olympic_committees.abbreviation'] == noc_abbreviation))
+        full_names, _ = self.group('athletes.full_name', self.linking_column('athlete_id')[mask])
+        return [(full_name,) for full_name in full_names]
+
+    def get_gold_medals_of_nocs(self):
+        """Returns the (country, gold medals) of every NOC country, counting the rows of linking_table with medal id 2 of all the NOCs of the country (0 for countries without any), from most gold medals to fewest."""
+        nocs = self.linking_column('national_olympic_committee_id')
+        gold_mask = (nocs >= 0) & self.refers_to('medal_id', self.columns['medals.id'] == 2)
+        number_of_nocs = len(self.columns['national_olympic_committees.id'])
+        noc_gold_medals = numpy.bincount(nocs[gold_mask], minlength=number_of_nocs)
+        country_gold_medals = {}
+        for country, gold_medals in zip(self.gather('national_olympic_committees.country', numpy.arange(number_of_nocs)), noc_gold_medals.tolist()):
+            country_gold_medals[country] = country_gold_medals.get(country, 0) + gold_medals
+        return sorted(country_gold_medals.items(), key=lambda country_and_gold_medals: (-country_and_gold_medals[1],) + get_text_sort_key(country_and_gold_medals[0]))
+
+    def get_top_athletes_of_sport(self, sport_name):
+        """Returns the (full name, gold medals) of every athlete name with a gold medal in the passed sport, from most gold medals to fewest."""
+        mask = self.joined('athlete_id', 'sport_id', 'medal_id')
+        mask &= self.refers_to('sport_id', self.where('sports.sport', self.columns['sports.sport'] == sport_name))
+        mask &= self.refers_to('medal_id', self.where('medals.medal', self.columns['medals.medal'] == 'Gold'))
+        full_names, gold_medals = self.group('athletes.full_name', self.linking_column('athlete_id')[mask])
+        return sorted(zip(full_names, gold_medals), key=lambda full_name_and_gold_medals: (-full_name_and_gold_medals[1],) + get_text_sort_key(full_name_and_gold_medals[0]))
+
+class EngineConnection:
+    """Stands in for a psycopg2 connection to the database, for code that only reads through olympics_queries.execute_query."""
+
+    is_embedded_engine = True
+    closed = 0
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def cursor(self, name=None):
+        """Returns a new cursor on the engine."""
+        return EngineCursor(self.engine, name)
+
+    def commit(self):
+        """Does nothing, as the engine is read-only."""
+
+    def rollback(self):
+        """Does nothing, as the engine is read-only."""
+
+    def close(self):
+        """Does nothing, as the engine is shared."""
+
+class EngineCursor:
+    """Stands in for a psycopg2 cursor, holding the rows of the last named query run on the engine."""
+
+    executes_named_queries = True
+
+    def __init__(self, engine, name=None):
+        self.engine = engine
+        self.name = name
+        self.rows = []
+        self.position = 0
+        self.rowcount = -1
+
+    def execute_query(self, query_name, parameters):
+        """Runs the named query of olympics_queries.py with the passed parameters."""
+        self.rows = self.engine.execute(query_name, parameters)
+        self.position = 0
+        self.rowcount = len(self.rows)
+
+    def fetchone(self):
+        """Returns the next row, or None if there are no more."""
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def fetchmany(self, size=1):
+        """Returns a list of up to `size` of the next rows."""
+        rows = self.rows[self.position:self.position + size]
+        self.position += len(rows)
+        return rows
+
+    def fetchall(self):
+        """Returns the list of all the remaining rows."""
+        return self.fetchmany(len(self.rows))
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        """Drops the rows."""
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception_information):
+        self.close()
+
+"""Executes the main program."""
+if __name__ == '__main__':
+    main()
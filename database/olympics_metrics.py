@@ -0,0 +1,86 @@
+import time
+import bisect
+import threading
+import contextlib
+
+"""Latency histograms and counters for olympics.py and olympics-api.py: how long each query, route and phase of a request takes, how many rows the routes send and how long requests wait for a pooled connection. They can be written out in the Prometheus text format for the API's /metrics route."""
+
+metric_descriptions = {
+    'olympics_query_duration_seconds': ('histogram', 'Time spent running each named query of olympics_queries, until its first rows are available.'),
+    'olympics_route_duration_seconds': ('histogram', 'Time spent handling each API route, until the response starts.'),
+    'olympics_phase_duration_seconds': ('histogram', 'Time spent in each phase of an API route: waiting on the database, building rows and serializing JSON.'),
+    'olympics_pool_wait_seconds': ('histogram', 'Time requests waited to check a connection out of the pool.'),
+    'olympics_rows_total': ('counter', 'Rows read from the database by each API route.'),
+}
+
+bucket_bounds = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+histograms = {}
+counters = {}
+metrics_lock = threading.Lock()
+
+def observe(metric_name, seconds, **labels):
+    """Adds the passed duration to the histogram of the metric with the passed labels."""
+    key = (metric_name, tuple(sorted(labels.items())))
+    with metrics_lock:
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = {'bucket_counts': [0] * (len(bucket_bounds) + 1), 'sum': 0.0, 'count': 0}
+        histogram['bucket_counts'][bisect.bisect_left(bucket_bounds, seconds)] += 1
+        histogram['sum'] += seconds
+        histogram['count'] += 1
+
+def increment(metric_name, amount=1, **labels):
+    """Adds the passed amount to the counter of the metric with the passed labels."""
+    key = (metric_name, tuple(sorted(labels.items())))
+    with metrics_lock:
+        counters[key] = counters.get(key, 0) + amount
+
+@contextlib.contextmanager
+def time_phase(metric_name, **labels):
+    """Times the body of the with statement into the histogram of the metric with the passed labels."""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(metric_name, time.perf_counter() - start_time, **labels)
+
+def get_prometheus_text():
+    """Returns every histogram and counter recorded so far in the Prometheus text exposition format."""
+    with metrics_lock:
+        histogram_items = sorted((key, dict(histogram, bucket_counts=list(histogram['bucket_counts']))) for key, histogram in histograms.items())
+        counter_items = sorted(counters.items())
+    lines = []
+    for metric_name, (metric_type, description) in metric_descriptions.items():
+        lines.append('# HELP ' + metric_name + ' ' + description)
+        lines.append('# TYPE ' + metric_name + ' ' + metric_type)
+        if metric_type == 'histogram':
+            for (name, labels), histogram in histogram_items:
+                if name == metric_name:
+                    lines.extend(get_histogram_lines(metric_name, labels, histogram))
+        else:
+            for (name, labels), value in counter_items:
+                if name == metric_name:
+                    lines.append(metric_name + get_label_text(labels) + ' ' + str(value))
+    return '\n'.join(lines) + '\n'
+
+def get_histogram_lines(metric_name, labels, histogram):
+    """Returns the cumulative bucket, sum and count lines of one histogram."""
+    lines = []
+    cumulative_count = 0
+    for bound, bucket_count in zip(bucket_bounds + ['+Inf'], histogram['bucket_counts']):
+        cumulative_count += bucket_count
+        lines.append(metric_name + '_bucket' + get_label_text(labels + (('le', str(bound)),)) + ' ' + str(cumulative_count))
+    lines.append(metric_name + '_sum' + get_label_text(labels) + ' ' + repr(histogram['sum']))
+    lines.append(metric_name + '_count' + get_label_text(labels) + ' ' + str(histogram['count']))
+    return lines
+
+def get_label_text(labels):
+    """Returns the {name="value",...} text of the passed labels, or nothing if there are none."""
+    if not labels:
+        return ''
+    escaped_labels = []
+    for label_name, label_value in labels:
+        label_value = str(label_value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped_labels.append(label_name + '="' + label_value + '"')
+    return '{' + ','.join(escaped_labels) + '}'
@@ -0,0 +1,349 @@
+import time
+import weakref
+import olympics_metrics
+
+"""The named SQL queries on the database described in olympics.sql, shared by olympics.py and olympics-api.py. Every query is fully parameterized, is prepared (PREPARE) once per database connection the first time it is run there and is then run with EXECUTE, so Postgres parses and plans it only once per connection. The exception is a query run on a server-side (named) cursor, which can't run EXECUTE: olympics-api.py streams /medalists/games/<games_id> that way, so the 'medalists' and 'medalists_by_noc' queries are sent as SQL and planned on every request. The time each query takes is recorded in the olympics_query_duration_seconds histogram of olympics_metrics.py as it runs. The indexes these queries rely on and the materialized views of gold medal counts that -lmn and -las read are also defined here; a query reading a view names, as its 'fallback', the query computing the same rows from linking_table, for databases where the views haven't been created yet. Text is ordered with the "C" collation (by character code) and ties are broken explicitly, so the rows come in the same order whatever the database's collation, and the same as from the embedded engine of olympics_engine.py."""
+
+queries = {
+    'nocs': {
+        'parameter_types': [],
+        'sql': '''SELECT DISTINCT
+          national_olympic_committees.abbreviation COLLATE "C" AS abbreviation,
+          national_olympic_committees.country COLLATE "C" AS country
+      FROM
+          national_olympic_committees
+      ORDER BY
+          abbreviation,
+          country''',
+    },
+    'games': {
+        'parameter_types': [],
+        'sql': '''SELECT
+      olympic_games.id,
+      olympic_games.year,
+      olympic_games.season,
+      olympic_games.city
+    FROM
+      olympic_games
+    ORDER BY
+      olympic_games.year,
+      olympic_games.id''',
+    },
+    'medalists': {
+        'parameter_types': ['integer', 'integer'],
+        'sql': '''SELECT
+          athletes.id,
+          athletes.name,
+          athletes.sex,
+          sports.sport,
+          events.event_title,
+          medals.medal
+      FROM
+          linking_table,
+          sports,
+          events,
+          athletes,
+          medals,
+          olympic_games
+      WHERE
+          linking_table.olympic_game_id = olympic_games.id AND
+          olympic_games.id = %s AND
+          linking_table.medal_id = medals.id AND
+          medals.medal != 'NA' AND
+          linking_table.athlete_id = athletes.id AND
+          athletes.id > %s AND
+          linking_table.sport_id = sports.id AND
+          linking_table.event_id = events.id
+      ORDER BY
+          athletes.id,
+          events.id,
+          medals.id''',
+    },
+    'medalists_by_noc': {
+        'parameter_types': ['integer', 'text', 'integer'],
+        'sql': '''SELECT
+          athletes.id,
+          athletes.name,
+          athletes.sex,
+          sports.sport,
+          events.event_title,
+          medals.medal
+      FROM
+          linking_table,
+          sports,
+          events,
+          athletes,
+          medals,
+          national_olympic_committees,
+          olympic_games
+      WHERE
+          linking_table.olympic_game_id = olympic_games.id AND
+          olympic_games.id = %s AND
+          linking_table.national_olympic_committee_id = national_olympic_committees.id AND
+          national_olympic_committees.abbreviation = %s AND
+          linking_table.medal_id = medals.id AND
+          medals.medal != 'NA' AND
+          linking_table.athlete_id = athletes.id AND
+          athletes.id > %s AND
+          linking_table.sport_id = sports.id AND
+          linking_table.event_id = events.id
+      ORDER BY
+          athletes.id,
+          events.id,
+          medals.id''',
+    },
+    'medalists_batch': {
+        'parameter_types': ['integer[]'],
+        'sql': '''SELECT
+          olympic_games.id,
+          national_olympic_committees.abbreviation,
+          athletes.id,
+          athletes.name,
+          athletes.sex,
+          sports.sport,
+          events.event_title,
+          medals.medal
+      FROM
+          linking_table,
+          sports,
+          events,
+          athletes,
+          medals,
+          national_olympic_committees,
+          olympic_games
+      WHERE
+          linking_table.olympic_game_id = olympic_games.id AND
+          olympic_games.id = ANY(%s) AND
+          linking_table.national_olympic_committee_id = national_olympic_committees.id AND
+          linking_table.medal_id = medals.id AND
+          medals.medal != 'NA' AND
+          linking_table.athlete_id = athletes.id AND
+          linking_table.sport_id = sports.id AND
+          linking_table.event_id = events.id
+      ORDER BY
+          olympic_games.id,
+          national_olympic_committees.abbreviation COLLATE "C",
+          athletes.id,
+          events.id,
+          medals.id''',
+    },
+    'medalists_batch_by_noc': {
+        'parameter_types': ['integer[]', 'text[]'],
+        'sql': '''SELECT
+          olympic_games.id,
+          national_olympic_committees.abbreviation,
+          athletes.id,
+          athletes.name,
+          athletes.sex,
+          sports.sport,
+          events.event_title,
+          medals.medal
+      FROM
+          linking_table,
+          sports,
+          events,
+          athletes,
+          medals,
+          national_olympic_committees,
+          olympic_games
+      WHERE
+          linking_table.olympic_game_id = olympic_games.id AND
+          olympic_games.id = ANY(%s) AND
+          linking_table.national_olympic_committee_id = national_olympic_committees.id AND
+          national_olympic_committees.abbreviation = ANY(%s) AND
+          linking_table.medal_id = medals.id AND
+          medals.medal != 'NA' AND
+          linking_table.athlete_id = athletes.id AND
+          linking_table.sport_id = sports.id AND
+          linking_table.event_id = events.id
+      ORDER BY
+          olympic_games.id,
+          national_olympic_committees.abbreviation COLLATE "C",
+          athletes.id,
+          events.id,
+          medals.id''',
+    },
+    'lan': {
+        'parameter_types': ['text'],
+        'sql': '''SELECT DISTINCT
+        athletes.full_name COLLATE "C" AS full_name
+    FROM
+        athletes,
+        linking_table,
+        national_olympic_committees
+    WHERE
+        linking_table.national_olympic_committee_id = national_olympic_committees.id AND
+        national_olympic_committees.abbreviation = %s AND
+        linking_table.athlete_id = athletes.id
+    ORDER BY
+        full_name''',
+    },
+    'lmn': {
+        'parameter_types': [],
+        'fallback': 'lmn_from_linking_table',
+        'sql': '''SELECT
+      gold_medals_per_noc.country,
+      gold_medals_per_noc.gold_medals
+    FROM
+      gold_medals_per_noc
+    ORDER BY
+      gold_medals_per_noc.gold_medals DESC,
+      gold_medals_per_noc.country COLLATE "C"''',
+    },
+    'las': {
+        'parameter_types': ['text'],
+        'fallback': 'las_from_linking_table',
+        'sql': '''SELECT
+      gold_medals_per_athlete_sport.full_name,
+      gold_medals_per_athlete_sport.gold_medals
+    FROM
+      gold_medals_per_athlete_sport
+    WHERE
+      gold_medals_per_athlete_sport.sport = %s
+    ORDER BY
+      gold_medals_per_athlete_sport.gold_medals DESC,
+      gold_medals_per_athlete_sport.full_name COLLATE "C"''',
+    },
+    'lmn_from_linking_table': {
+        'parameter_types': [],
+        'sql': '''SELECT
+      national_olympic_committees.country,
+      COUNT(linking_table.medal_id) AS gold_medals
+    FROM
+      national_olympic_committees
+    LEFT JOIN
+      linking_table
+    ON
+      linking_table.national_olympic_committee_id = national_olympic_committees.id
+      AND
+      linking_table.medal_id = '2'
+    GROUP BY
+      national_olympic_committees.country
+    ORDER BY
+      gold_medals DESC,
+      national_olympic_committees.country COLLATE "C"''',
+    },
+    'las_from_linking_table': {
+        'parameter_types': ['text'],
+        'sql': '''SELECT
+      athletes.full_name,
+      COUNT(*) AS gold_medals
+    FROM
+      sports,
+      athletes,
+      linking_table,
+      medals
+    WHERE
+      linking_table.sport_id = sports.id AND
+      sports.sport = %s AND
+      linking_table.medal_id = medals.id AND
+      medals.medal = 'Gold' AND
+      linking_table.athlete_id = athletes.id
+    GROUP BY
+      athletes.full_name
+    ORDER BY
+      gold_medals DESC,
+      athletes.full_name COLLATE "C"''',
+    },
+}
+
+index_statements = [
+    '''CREATE INDEX IF NOT EXISTS linking_table_noc_athlete ON linking_table (national_olympic_committee_id, athlete_id)''',
+    '''CREATE INDEX IF NOT EXISTS linking_table_medal_noc ON linking_table (medal_id, national_olympic_committee_id)''',
+    '''CREATE INDEX IF NOT EXISTS linking_table_sport_medal_athlete ON linking_table (sport_id, medal_id, athlete_id)''',
+    '''CREATE INDEX IF NOT EXISTS linking_table_games_medal_noc ON linking_table (olympic_game_id, medal_id, national_olympic_committee_id)''',
+    '''CREATE INDEX IF NOT EXISTS linking_table_athlete ON linking_table (athlete_id)''',
+    '''CREATE INDEX IF NOT EXISTS national_olympic_committees_abbreviation ON national_olympic_committees (abbreviation)''',
+    '''CREATE INDEX IF NOT EXISTS sports_sport ON sports (sport)''',
+]
+
+materialized_view_statements = [
+    '''CREATE MATERIALIZED VIEW IF NOT EXISTS gold_medals_per_noc AS
+    SELECT
+      national_olympic_committees.country,
+      COUNT(linking_table.medal_id) AS gold_medals
+    FROM
+      national_olympic_committees
+    LEFT JOIN
+      linking_table
+    ON
+      linking_table.national_olympic_committee_id = national_olympic_committees.id
+      AND
+      linking_table.medal_id = '2'
+    GROUP BY
+      national_olympic_committees.country''',
+    '''CREATE UNIQUE INDEX IF NOT EXISTS gold_medals_per_noc_country ON gold_medals_per_noc (country)''',
+    '''CREATE MATERIALIZED VIEW IF NOT EXISTS gold_medals_per_athlete_sport AS
+    SELECT
+      sports.sport,
+      athletes.full_name,
+      COUNT(*) AS gold_medals
+    FROM
+      sports,
+      athletes,
+      linking_table,
+      medals
+    WHERE
+      linking_table.sport_id = sports.id AND
+      linking_table.medal_id = medals.id AND
+      medals.medal = 'Gold' AND
+      linking_table.athlete_id = athletes.id
+    GROUP BY
+      sports.sport,
+      athletes.full_name''',
+    '''CREATE UNIQUE INDEX IF NOT EXISTS gold_medals_per_athlete_sport_sport_name ON gold_medals_per_athlete_sport (sport, full_name)''',
+    '''CREATE INDEX IF NOT EXISTS gold_medals_per_athlete_sport_sport_medals ON gold_medals_per_athlete_sport (sport, gold_medals DESC)''',
+]
+
+refresh_statements = [
+    '''REFRESH MATERIALIZED VIEW CONCURRENTLY gold_medals_per_noc''',
+    '''REFRESH MATERIALIZED VIEW CONCURRENTLY gold_medals_per_athlete_sport''',
+]
+
+prepared_query_names = weakref.WeakKeyDictionary()
+
+def execute_query(cursor, query_name, parameters=()):
+    """Runs the named query with the passed parameters on the cursor and records how long it took. A regular cursor runs the statement prepared on its connection (preparing it first if needed); a server-side (named) cursor can't run EXECUTE, so it runs the query's SQL with the parameters instead. A cursor of the embedded engine (see olympics_engine.py) answers the named query itself."""
+    start_time = time.perf_counter()
+    try:
+        if getattr(cursor, 'executes_named_queries', False):
+            cursor.execute_query(query_name, parameters)
+        elif cursor.name is None:
+            prepare_query(cursor.connection, query_name)
+            cursor.execute(get_execute_statement(query_name), tuple(parameters))
+        else:
+            cursor.execute(queries[query_name]['sql'], tuple(parameters))
+    finally:
+        record_query_time(query_name, time.perf_counter() - start_time)
+
+def prepare_query(connection, query_name):
+    """Prepares the named query on the connection, unless it already was."""
+    connection_query_names = prepared_query_names.setdefault(connection, set())
+    if query_name in connection_query_names:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(get_prepare_statement(query_name))
+    connection_query_names.add(query_name)
+
+def get_prepare_statement(query_name):
+    """Returns the PREPARE statement of the named query, with its %s placeholders numbered $1, $2, ... in order."""
+    query = queries[query_name]
+    sql_parts = query['sql'].split('%s')
+    numbered_sql = sql_parts[0]
+    for parameter_number in range(1, len(sql_parts)):
+        numbered_sql += '$' + str(parameter_number) + sql_parts[parameter_number]
+    parameter_types = ''
+    if query['parameter_types']:
+        parameter_types = ' (' + ', '.join(query['parameter_types']) + ')'
+    return 'PREPARE ' + query_name + parameter_types + ' AS ' + numbered_sql
+
+def get_execute_statement(query_name):
+    """Returns the EXECUTE statement of the named query, with a %s placeholder for each of its parameters."""
+    number_of_parameters = len(queries[query_name]['parameter_types'])
+    if number_of_parameters == 0:
+        return 'EXECUTE ' + query_name
+    return 'EXECUTE ' + query_name + ' (' + ', '.join(['%s'] * number_of_parameters) + ')'
+
+def record_query_time(query_name, seconds):
+    """Adds a run of the named query taking the passed number of seconds to its latency histogram."""
+    olympics_metrics.observe('olympics_query_duration_seconds', seconds, query=query_name)
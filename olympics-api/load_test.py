@@ -0,0 +1,197 @@
+'''Load tests olympics-api.py: writes a synthetic Olympics data set (see generate_olympics.py) at the chosen scale, snapshots it for the embedded engine (see olympics_engine.py), starts the API on a free local port answering from that snapshot, then sends /nocs, /games and /medalists/games/<games_id> requests from concurrent clients and prints the throughput and latency percentiles as JSON. With --database the API runs against the database in config.py instead, with whatever data it holds. Run "load_test.py -h" for its options.
+'''
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import socket
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+import urllib.parse
+import urllib.error
+import urllib.request
+import concurrent.futures
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'database'))
+import generate_olympics
+
+api_file_name = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'olympics-api.py')
+route_names = ['nocs', 'games', 'medalists']
+
+def main():
+    '''Reads the command line, sets up the data and the API, runs the load test and prints (or saves) the JSON report.'''
+    arguments = get_command_line_arguments()
+    with tempfile.TemporaryDirectory() as directory:
+        api_arguments = get_api_arguments(arguments, directory)
+        with start_api(api_arguments, directory, arguments.startup_timeout) as base_url:
+            urls = get_request_urls(base_url, arguments.requests, arguments.weights, arguments.seed)
+            run_requests(get_request_urls(base_url, arguments.warmup, arguments.weights, arguments.seed + 1), arguments.concurrency, arguments.timeout)
+            start_time = time.perf_counter()
+            results = run_requests(urls, arguments.concurrency, arguments.timeout)
+            seconds = time.perf_counter() - start_time
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'backend': 'database' if arguments.database else 'engine',
+        'rows': None if arguments.database else arguments.rows,
+        'concurrency': arguments.concurrency,
+        'api_arguments': api_arguments[4:],
+        'seconds': seconds,
+    }
+    report.update(get_statistics(results, seconds))
+    report['routes'] = {route_name: get_statistics([result for result in results if result[0] == route_name], seconds) for route_name in route_names}
+    report_json = json.dumps(report, indent=2)
+    if arguments.output:
+        with open(arguments.output, 'w') as report_file:
+            report_file.write(report_json + '\n')
+    else:
+        print(report_json)
+
+def get_command_line_arguments():
+    '''Return parsed command line arguments made using argparse.'''
+    parser = argparse.ArgumentParser(description='Load tests olympics-api.py on a synthetic data set and prints requests/sec and latency percentiles as JSON.')
+    parser.add_argument('--rows', '-n', type=int, default=270000, help='the number of rows of the synthetic athlete_events.csv (default 270000, about the size of the real data set)')
+    parser.add_argument('--seed', '-s', type=int, default=257, help='the random seed of the data set and of the requests sent (default 257)')
+    parser.add_argument('--database', action='store_true', help='run the API against the database in config.py, with the data it holds, instead of a synthetic snapshot')
+    parser.add_argument('--requests', '-r', type=int, default=2000, help='the number of requests timed (default 2000)')
+    parser.add_argument('--warmup', type=int, default=50, help='the number of requests sent before timing starts (default 50)')
+    parser.add_argument('--concurrency', '-c', type=int, default=8, help='the number of clients sending requests at once (default 8)')
+    parser.add_argument('--weights', '-w', type=float, nargs=3, default=[1, 1, 8], metavar=('NOCS', 'GAMES', 'MEDALISTS'), help='the relative number of /nocs, /games and /medalists/games/<games_id> requests (default 1 1 8)')
+    parser.add_argument('--pool-size', type=int, help='passed on to olympics-api.py')
+    parser.add_argument('--cache-size', type=int, help='passed on to olympics-api.py, 0 to time every request without the response cache')
+    parser.add_argument('--timeout', type=float, default=30.0, help='how many seconds a client waits for a response before counting it as an error (default 30)')
+    parser.add_argument('--startup-timeout', type=float, default=120.0, help='how many seconds to wait for the API to start answering (default 120)')
+    parser.add_argument('--output', '-o', help='the file to save the JSON report to, instead of printing it')
+    return parser.parse_args()
+
+def get_api_arguments(arguments, directory):
+    '''Returns the command line that starts olympics-api.py on a free local port, first writing the synthetic data set and its snapshot into the passed directory unless --database was given.'''
+    api_arguments = [sys.executable, api_file_name, '127.0.0.1', str(get_free_port()), '--no-debug']
+    if not arguments.database:
+        api_arguments += ['--engine', write_synthetic_snapshot(directory, arguments.rows, arguments.seed)]
+    if arguments.pool_size is not None:
+        api_arguments += ['--pool-size', str(arguments.pool_size)]
+    if arguments.cache_size is not None:
+        api_arguments += ['--cache-size', str(arguments.cache_size)]
+    return api_arguments
+
+def write_synthetic_snapshot(directory, number_of_rows, seed):
+    '''Writes a synthetic data set of the passed number of rows into the directory, builds an engine snapshot of it there and returns the snapshot's path.'''
+    import olympics_dataset
+    import olympics_engine
+    athlete_events_file_name = os.path.join(directory, 'athlete_events.csv')
+    regions_file_name = os.path.join(directory, 'noc_regions.csv')
+    with open(athlete_events_file_name, 'w', newline='') as athlete_events_file:
+        generate_olympics.write_synthetic_athlete_events(athlete_events_file, number_of_rows, seed)
+    with open(regions_file_name, 'w', newline='') as regions_file:
+        generate_olympics.write_synthetic_noc_regions(regions_file)
+    snapshot_directory = os.path.join(directory, 'snapshot')
+    olympics_engine.build_snapshot(olympics_dataset.read_olympics_dataset(athlete_events_file_name, regions_file_name), snapshot_directory)
+    return snapshot_directory
+
+def get_free_port():
+    '''Returns a local port no one is listening on.'''
+    with socket.socket() as free_socket:
+        free_socket.bind(('127.0.0.1', 0))
+        return free_socket.getsockname()[1]
+
+@contextlib.contextmanager
+def start_api(api_arguments, directory, startup_timeout):
+    '''Starts the API with the passed command line, waits until it answers and yields its base url, stopping it afterwards. Its output goes to api.log in the passed directory, which is printed if it fails to start.'''
+    base_url = 'http://' + api_arguments[2] + ':' + api_arguments[3]
+    log_file_name = os.path.join(directory, 'api.log')
+    with open(log_file_name, 'w') as log_file:
+        api_process = subprocess.Popen(api_arguments, stdout=log_file, stderr=subprocess.STDOUT, cwd=os.path.dirname(api_file_name))
+    try:
+        wait_for_api(api_process, base_url, startup_timeout, log_file_name)
+        yield base_url
+    finally:
+        api_process.terminate()
+        try:
+            api_process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            api_process.kill()
+
+def wait_for_api(api_process, base_url, startup_timeout, log_file_name):
+    '''Waits until the API answers /games, raising RuntimeError (with its log) if it exits or doesn't answer in time.'''
+    give_up_time = time.monotonic() + startup_timeout
+    while time.monotonic() < give_up_time:
+        if api_process.poll() is not None:
+            break
+        try:
+            with urllib.request.urlopen(base_url + '/games', timeout=5) as response:
+                response.read()
+            return
+        except Exception:
+            time.sleep(0.2)
+    with open(log_file_name) as log_file:
+        raise RuntimeError('olympics-api.py did not start:\n' + log_file.read())
+
+def get_request_urls(base_url, number_of_requests, weights, seed):
+    '''Returns a list of (route name, url) of the passed number of requests, with the routes drawn in proportion to the weights and the medalists of a random games (of those /games lists) asked for, each time with its NOC chosen a quarter of the time.'''
+    generator = random.Random(seed)
+    with urllib.request.urlopen(base_url + '/games') as response:
+        list_of_games_ids = [list(games)[0] for games in json.load(response)]
+    with urllib.request.urlopen(base_url + '/nocs') as response:
+        list_of_noc_abbreviations = [list(noc)[0] for noc in json.load(response)]
+    urls = []
+    for route_name in generator.choices(route_names, weights=weights, k=number_of_requests):
+        if route_name == 'medalists':
+            url = base_url + '/medalists/games/' + str(generator.choice(list_of_games_ids))
+            if list_of_noc_abbreviations and generator.random() < 0.25:
+                url += '?noc=' + urllib.parse.quote(generator.choice(list_of_noc_abbreviations))
+        else:
+            url = base_url + '/' + route_name
+        urls.append((route_name, url))
+    return urls
+
+def run_requests(urls, concurrency, timeout):
+    '''Sends the requests from the passed number of concurrent clients and returns the (route name, seconds, status) of each, with a status of None if no response came.'''
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(lambda route_name_and_url: send_request(route_name_and_url, timeout), urls))
+
+def send_request(route_name_and_url, timeout):
+    '''Sends one request and returns its (route name, seconds until the whole response was read, status).'''
+    route_name, url = route_name_and_url
+    start_time = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = None
+    return (route_name, time.perf_counter() - start_time, status)
+
+def get_statistics(results, seconds):
+    '''Returns the number of requests, errors (no response or a status of 400 or more), requests per second and latency percentiles in milliseconds of the passed results, sent over the passed number of seconds.'''
+    latencies = sorted(result[1] * 1000 for result in results)
+    statistics = {
+        'requests': len(results),
+        'errors': sum(1 for result in results if result[2] is None or result[2] >= 400),
+        'requests_per_second': len(results) / seconds if seconds else None,
+        'latency_ms': None,
+    }
+    if latencies:
+        statistics['latency_ms'] = {
+            'mean': sum(latencies) / len(latencies),
+            'p50': get_percentile(latencies, 50),
+            'p95': get_percentile(latencies, 95),
+            'p99': get_percentile(latencies, 99),
+            'max': latencies[-1],
+        }
+    return statistics
+
+def get_percentile(sorted_values, percent):
+    '''Returns the nearest-rank percentile of the sorted values.'''
+    return sorted_values[max(0, math.ceil(percent / 100 * len(sorted_values)) - 1)]
+
+if __name__ == '__main__':
+    main()
@@ -3,167 +3,589 @@ Date: 02/02/2021
 A introduction to APIs using the Olympics database designed last week.
 '''
 
+import os
+import sys
+import gzip
+import zlib
+import time
+import hashlib
+import ipaddress
+import argparse
+import threading
+import collections
 import flask
 import json
 import psycopg2
+import psycopg2.extensions
 from config import database, user, password
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'database'))
+import olympics_queries
+import olympics_metrics
+
 app = flask.Flask(__name__)
 
+connection_pool = None
+connection_pool_lock = threading.Lock()
+connection_pool_size = 10
+connection_pool_timeout = 5.0
+
+response_cache = None
+response_cache_lock = threading.Lock()
+response_cache_size = 256
+route_cache_ttls = {'nocs': 3600, 'games': 3600, 'medalists': 300}
+largest_cached_stream_size = 1024 * 1024
+medalists_fetch_size = 500
+
+columnar_mimetype = 'application/vnd.olympics.columnar+json'
+gzip_minimum_size = 16 * 1024
+route_column_names = {
+    'nocs': ['abbreviation', 'country'],
+    'games': ['id', 'year', 'season', 'city'],
+    'medalists': ['athlete_id', 'name', 'sex', 'sport', 'event', 'medal'],
+    'medalists_batch': ['games_id', 'noc', 'athlete_id', 'name', 'sex', 'sport', 'event', 'medal'],
+}
+
+engine_snapshot = None
+engine = None
+engine_lock = threading.Lock()
+
 @app.route('/nocs')
 def get_nocs():
-    '''Returns a list of dictionaries, each of which represents one National Olympic Committee, alphabetized by NOC abbreviation.'''
-    query = get_nocs_query()
-    cursor = query_database(query)
-    list_of_nocs = convert_cursor_to_list_of_dictionaries(cursor)
-    return json.dumps(list_of_nocs)
+    '''Returns a list of dictionaries, each of which represents one National Olympic Committee, alphabetized by NOC abbreviation. Like every route below, it answers in the columnar format instead if asked to (see get_response_format).'''
+    return get_cached_response(('nocs',), 'nocs', get_nocs_json)
 
 @app.route('/games')
 def get_games():
     '''Returns a list of dictionaries, each of which represents one Olympic games, sorted by year.'''
-    query = get_games_query()
-    cursor = query_database(query)
-    list_of_games = convert_cursor_to_list_of_dictionaries(cursor)
-    return json.dumps(list_of_games)
+    return get_cached_response(('games',), 'games', get_games_json)
 
 @app.route('/medalists/games/<games_id>')
 def get_medalists(games_id):
-    '''Returns a list of dictionaries, each representing one athlete who earned a medal in the specified games.  If a GET parameter refering to a noc abbreviation is present, returns only those medalists who were on the specified NOC's team during the specified games.'''
+    '''Returns a list of dictionaries, each representing one athlete who earned a medal in the specified games, ordered by athlete id.  If a GET parameter refering to a noc abbreviation is present, returns only those medalists who were on the specified NOC's team during the specified games.  The optional GET parameters 'limit' and 'after' page through the medalists: 'limit' caps the number of athletes in the response and 'after' skips the athletes whose id is at most its value, so the next page is requested with 'after' set to the id of the last athlete received.'''
     noc_abbreviation = flask.request.args.get('noc', default='-1')
-    query = get_medalists_query(games_id, noc_abbreviation)
-    cursor = query_database(query)
-    if cursor.rowcount > 0:
-        list_of_medalists = convert_cursor_to_list_of_dictionaries(cursor)
-        return json.dumps(list_of_medalists)
+    after = flask.request.args.get('after', default=0, type=int)
+    limit = flask.request.args.get('limit', default=None, type=int)
+    if not games_id.isdigit():
+        flask.abort(400, description='The games should be a games id, e.g. /medalists/games/1.')
+    if limit is not None and limit < 1:
+        flask.abort(400, description='The limit should be a positive number of athletes.')
+    response_format = get_response_format()
+    cache_key = ('medalists', games_id, noc_abbreviation, after, limit, response_format)
+    cached_entry = get_cached_entry(cache_key, 'medalists')
+    if cached_entry is not None:
+        return make_cached_response(cached_entry[0], 'medalists', response_format, cached_entry[1])
+    return stream_medalists_json(cache_key, games_id, noc_abbreviation, after, limit, response_format)
+
+@app.route('/medalists/batch')
+def get_medalists_batch():
+    '''Returns the medalists of several games at once, as a dictionary from each games id to a dictionary from each NOC abbreviation to the list of dictionaries of that NOC's medalists at those games (in the format of /medalists/games/<games_id>). The games ids are given by the GET parameter 'games' and the optional NOC abbreviations by 'nocs', each either comma-separated or repeated, e.g. /medalists/batch?games=1,2,3&nocs=USA,KEN. Without 'nocs' every NOC with medalists is included. All of them are answered by a single query. In the columnar format the medalists are instead a flat list of rows, each starting with its games id and NOC abbreviation, so games and NOCs without medalists are left out.'''
+    list_of_games_ids = get_list_argument('games')
+    list_of_noc_abbreviations = get_list_argument('nocs')
+    if not list_of_games_ids or not all(games_id.isdigit() for games_id in list_of_games_ids):
+        flask.abort(400, description='The games should be a list of games ids, e.g. games=1,2,3.')
+    list_of_games_ids = sorted(set(int(games_id) for games_id in list_of_games_ids))
+    list_of_noc_abbreviations = sorted(set(list_of_noc_abbreviations))
+    cache_key = ('medalists_batch', tuple(list_of_games_ids), tuple(list_of_noc_abbreviations))
+    return get_cached_response(cache_key, 'medalists', lambda response_format: get_medalists_batch_json(list_of_games_ids, list_of_noc_abbreviations, response_format))
+
+@app.route('/metrics')
+def get_metrics():
+    '''Returns the latency histograms of the routes, their phases, the queries and the connection pool waits, and the row counts of the routes, in the Prometheus text format.'''
+    return flask.Response(olympics_metrics.get_prometheus_text(), mimetype='text/plain; version=0.0.4')
+
+@app.before_request
+def start_route_timer():
+    '''Notes when the request started, for the route latency histogram.'''
+    flask.g.request_start_time = time.perf_counter()
+
+@app.after_request
+def record_route_time(response):
+    '''Adds the time the request took until its response started to the latency histogram of its route.'''
+    if 'request_start_time' in flask.g:
+        olympics_metrics.observe('olympics_route_duration_seconds', time.perf_counter() - flask.g.request_start_time, route=get_route_name(), status=response.status_code)
+    return response
+
+def get_route_name():
+    '''Returns the rule of the route handling the request, e.g. '/medalists/games/<games_id>', so that its metrics aren't split by games id.'''
+    if flask.request.url_rule is None:
+        return 'unmatched'
+    return flask.request.url_rule.rule
+
+def time_route_phase(phase):
+    '''Returns a context manager timing its body into the histogram of the passed phase of the request's route.'''
+    return olympics_metrics.time_phase('olympics_phase_duration_seconds', route=get_route_name(), phase=phase)
+
+@app.route('/cache/clear', methods=['POST'])
+def clear_response_cache():
+    '''Empties the response cache, so that responses are rebuilt from the database after its data has been reloaded, and returns how many responses were dropped. Only callers on the same machine (a loopback address) may clear it; anyone else gets a 403 error, so that a client who can reach the API can't keep sending every request back to the database.'''
+    if not request_is_from_loopback():
+        flask.abort(403, description='The cache can only be cleared from the machine the API runs on.')
+    return json.dumps({'cleared': get_response_cache().clear()})
+
+def request_is_from_loopback():
+    '''Returns whether the request came from a loopback address (127.0.0.0/8 or ::1, including 127.0.0.0/8 mapped into IPv6).'''
+    try:
+        remote_address = ipaddress.ip_address(flask.request.remote_addr)
+    except ValueError:
+        return False
+    return (getattr(remote_address, 'ipv4_mapped', None) or remote_address).is_loopback
+
+def get_nocs_json(response_format):
+    '''Returns the JSON of all the NOCs in the database, in the passed format.'''
+    query = get_nocs_query()
+    with time_route_phase('database'):
+        cursor = query_database(query)
+    return get_cursor_json(cursor, route_column_names['nocs'], response_format)
+
+def get_games_json(response_format):
+    '''Returns the JSON of all the olympic games in the database, in the passed format.'''
+    query = get_games_query()
+    with time_route_phase('database'):
+        cursor = query_database(query)
+    return get_cursor_json(cursor, route_column_names['games'], response_format)
+
+def get_cursor_json(cursor, column_names, response_format):
+    '''Returns the JSON of the rows of the passed cursor: the list of their dictionaries (see convert_row_to_dictionary), or in the columnar format a dictionary of the passed column names and the list of the rows themselves, encoded as the cursor gives them.'''
+    with time_route_phase('rows'):
+        if response_format == 'columnar':
+            rows = list(cursor)
+        else:
+            rows = convert_cursor_to_list_of_dictionaries(cursor)
+    olympics_metrics.increment('olympics_rows_total', len(rows), route=get_route_name())
+    with time_route_phase('json'):
+        if response_format == 'columnar':
+            return json.dumps({'columns': column_names, 'rows': rows})
+        return json.dumps(rows)
+
+def stream_medalists_json(cache_key, games_id, noc_abbreviation, after, limit, response_format):
+    '''Returns a response streaming the JSON of the specified medalists, in the passed format, as it is read from a server-side cursor, a chunk at a time, so the whole result is never held in memory. If the first chunk is a full one and the client accepts gzip, the stream is gzipped. Returns (and caches) a message (an empty list of rows in the columnar format) instead if there were no medalists.'''
+    query = get_medalists_query(games_id, noc_abbreviation, after)
+    with time_route_phase('database'):
+        cursor = query_database(query, cursor_name='medalists_cursor')
+        try:
+            rows = cursor.fetchmany(medalists_fetch_size)
+        except Exception as e:
+            abort_on_database_error(e)
+    if not rows:
+        if response_format == 'columnar':
+            body = json.dumps({'columns': route_column_names['medalists'], 'rows': []}).encode('utf-8')
+        else:
+            body = 'There were no medalists in this instance.'.encode('utf-8')
+        return make_cached_response(put_cached_body(cache_key, body, 'medalists'), 'medalists', response_format)
+    compressor = None
+    if len(rows) == medalists_fetch_size and gzip_is_accepted():
+        compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    response = flask.Response(flask.stream_with_context(generate_medalists_json(cache_key, cursor, rows, limit, response_format, compressor)))
+    return hand_database_connection_to(set_format_headers(response, response_format, 'gzip' if compressor else None))
+
+def generate_medalists_json(cache_key, cursor, rows, limit, response_format, compressor=None):
+    '''Yields the JSON of the medalists of the passed first rows and the rest of the cursor, in the passed format and exactly as json.dumps gives the whole response, stopping before the first row of the athlete past the limit. If a zlib compressor is passed, each chunk is yielded compressed (and flushed, so clients get it right away). The uncompressed response is cached once complete unless it is too large. The time spent fetching and serializing the later chunks is recorded once the response is complete.'''
+    route_name = get_route_name()
+    database_seconds = 0.0
+    json_seconds = 0.0
+    number_of_rows = 0
+    chunks_to_cache = []
+    cached_size = 0
+    if response_format == 'columnar':
+        separator = '{"columns": ' + json.dumps(route_column_names['medalists']) + ', "rows": ['
+        closing = ']}'
     else:
-        return 'There were no medalists in this instance.'
+        separator = '['
+        closing = ']'
+    last_athlete_id = None
+    number_of_athletes = 0
+    while rows:
+        phase_start_time = time.perf_counter()
+        number_of_rows_in_chunk = 0
+        for row in rows:
+            if row[0] != last_athlete_id:
+                if limit is not None and number_of_athletes == limit:
+                    break
+                last_athlete_id = row[0]
+                number_of_athletes += 1
+            number_of_rows_in_chunk += 1
+        chunk = b''
+        if number_of_rows_in_chunk:
+            chunk = (separator + get_rows_json(rows[:number_of_rows_in_chunk], response_format)).encode('utf-8')
+            separator = ', '
+        number_of_rows += number_of_rows_in_chunk
+        if number_of_rows_in_chunk < len(rows):
+            rows = []
+        json_seconds += time.perf_counter() - phase_start_time
+        if chunks_to_cache is not None:
+            cached_size += len(chunk)
+            if cached_size <= largest_cached_stream_size:
+                chunks_to_cache.append(chunk)
+            else:
+                chunks_to_cache = None
+        yield compress_chunk(compressor, chunk)
+        if rows:
+            phase_start_time = time.perf_counter()
+            rows = cursor.fetchmany(medalists_fetch_size)
+            database_seconds += time.perf_counter() - phase_start_time
+    closing = closing.encode('utf-8')
+    yield compress_chunk(compressor, closing)
+    if compressor is not None:
+        yield compressor.flush()
+    olympics_metrics.observe('olympics_phase_duration_seconds', database_seconds, route=route_name, phase='database_stream')
+    olympics_metrics.observe('olympics_phase_duration_seconds', json_seconds, route=route_name, phase='json')
+    olympics_metrics.increment('olympics_rows_total', number_of_rows, route=route_name)
+    if chunks_to_cache is not None:
+        put_cached_body(cache_key, b''.join(chunks_to_cache) + closing, 'medalists')
+
+def get_rows_json(rows, response_format):
+    '''Returns the JSON of the items of the list of the passed rows, without the brackets around them: the dictionaries of the rows (see convert_row_to_dictionary), or in the columnar format the rows themselves as arrays.'''
+    if response_format == 'columnar':
+        return json.dumps(rows)[1:-1]
+    return ', '.join(json.dumps(convert_row_to_dictionary(row)) for row in rows)
+
+def compress_chunk(compressor, chunk):
+    '''Returns the chunk compressed and flushed by the passed zlib compressor, or the chunk itself if there is no compressor.'''
+    if compressor is None:
+        return chunk
+    return compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+def get_medalists_batch_json(list_of_games_ids, list_of_noc_abbreviations, response_format):
+    '''Returns the JSON dictionary of the medalists of the passed games, grouped by games id and then by NOC abbreviation. Each requested games id (and, if NOCs were passed, each requested NOC under it) is present even if it had no medalists. In the columnar format, returns the rows of the medalists as the query gives them instead.'''
+    if response_format == 'columnar':
+        query = get_medalists_batch_query(list_of_games_ids, list_of_noc_abbreviations)
+        with time_route_phase('database'):
+            cursor = query_database(query)
+        return get_cursor_json(cursor, route_column_names['medalists_batch'], response_format)
+    dictionary_of_medalists = {}
+    for games_id in list_of_games_ids:
+        dictionary_of_medalists[str(games_id)] = {noc_abbreviation: [] for noc_abbreviation in list_of_noc_abbreviations}
+    query = get_medalists_batch_query(list_of_games_ids, list_of_noc_abbreviations)
+    with time_route_phase('database'):
+        cursor = query_database(query)
+    number_of_rows = 0
+    with time_route_phase('rows'):
+        for row in cursor:
+            dictionary_of_medalists[str(row[0])].setdefault(row[1], []).append(convert_row_to_dictionary(row[2:]))
+            number_of_rows += 1
+    olympics_metrics.increment('olympics_rows_total', number_of_rows, route=get_route_name())
+    with time_route_phase('json'):
+        return json.dumps(dictionary_of_medalists)
+
+def get_list_argument(argument_name):
+    '''Returns the list of values of the GET parameter, which may be repeated and may hold comma-separated values.'''
+    list_of_values = []
+    for argument in flask.request.args.getlist(argument_name):
+        list_of_values.extend(value.strip() for value in argument.split(',') if value.strip())
+    return list_of_values
+
+def get_response_format():
+    '''Returns the format the request asks for: 'columnar' with the GET parameter format=columnar or an Accept header preferring application/vnd.olympics.columnar+json, for a dictionary of the column names and the list of the rows as arrays ({"columns": [...], "rows": [[...], ...]}), and 'rows' otherwise, for the default format. Aborts the request with a 400 error for any other format.'''
+    response_format = flask.request.args.get('format')
+    if response_format is None:
+        if flask.request.accept_mimetypes[columnar_mimetype] > flask.request.accept_mimetypes['application/json']:
+            return 'columnar'
+        return 'rows'
+    if response_format not in ('rows', 'columnar'):
+        flask.abort(400, description='The format should be rows or columnar.')
+    return response_format
+
+def gzip_is_accepted():
+    '''Returns whether the request's Accept-Encoding header allows gzip.'''
+    return flask.request.accept_encodings['gzip'] > 0
+
+def get_cached_response(cache_key, route_name, get_response_text):
+    '''Returns the response cached under the passed key and the requested format, or builds it with the passed function of the format (which queries the database) and caches it for the route's time to live.'''
+    response_format = get_response_format()
+    cache_key = cache_key + (response_format,)
+    cached_entry = get_cached_entry(cache_key, route_name)
+    if cached_entry is None:
+        body = get_response_text(response_format).encode('utf-8')
+        cached_entry = (put_cached_body(cache_key, body, route_name), None)
+        if gzip_is_accepted() and len(body) >= gzip_minimum_size:
+            cached_entry = (put_cached_body(cache_key, gzip.compress(body, mtime=0), route_name, 'gzip'), 'gzip')
+    return make_cached_response(cached_entry[0], route_name, response_format, cached_entry[1])
 
-def query_database(query):
-    '''Executes the passed query and returns the resulting cursor or prints an error message and returns an empty string if the query failed.'''
+def get_cached_entry(cache_key, route_name):
+    '''Returns the (body, ETag) cached under the key and the content encoding of the body ('gzip' or None), or None if nothing is cached. If the client accepts gzip, a gzipped body is returned when the plain one is large enough, compressing and caching it on first use.'''
+    accepts_gzip = gzip_is_accepted()
+    if accepts_gzip:
+        cached_response = get_response_cache().get(cache_key + ('gzip',))
+        if cached_response is not None:
+            return cached_response, 'gzip'
+    cached_response = get_response_cache().get(cache_key + (None,))
+    if cached_response is None:
+        return None
+    if accepts_gzip and len(cached_response[0]) >= gzip_minimum_size:
+        return put_cached_body(cache_key, gzip.compress(cached_response[0], mtime=0), route_name, 'gzip'), 'gzip'
+    return cached_response, None
+
+def put_cached_body(cache_key, body, route_name, content_encoding=None):
+    '''Caches the body, encoded with the passed content encoding, under the key for the route's time to live and returns its (body, ETag).'''
+    return body, get_response_cache().put(cache_key + (content_encoding,), body, route_cache_ttls[route_name])
+
+def make_cached_response(cached_response, route_name, response_format='rows', content_encoding=None):
+    '''Returns the response for the passed cached (body, ETag), in the passed format and content encoding. It carries the ETag, and becomes an empty 304 response if the request's If-None-Match already holds it, so clients with a fresh copy never touch the database.'''
+    body, etag = cached_response
+    response = set_format_headers(flask.make_response(body), response_format, content_encoding)
+    response.set_etag(etag)
+    response.cache_control.max_age = route_cache_ttls[route_name]
+    return response.make_conditional(flask.request)
+
+def set_format_headers(response, response_format, content_encoding):
+    '''Sets the content type of the columnar format and the content encoding on the passed response, notes that it varies with the Accept and Accept-Encoding headers, and returns it.'''
+    if response_format == 'columnar':
+        response.mimetype = columnar_mimetype
+    if content_encoding:
+        response.headers['Content-Encoding'] = content_encoding
+    response.vary.update(['Accept', 'Accept-Encoding'])
+    return response
+
+def get_response_cache():
+    '''Returns the response cache shared by all the routes, creating it with the configured size on first use.'''
+    global response_cache
+    with response_cache_lock:
+        if response_cache is None:
+            response_cache = ResponseCache(response_cache_size)
+    return response_cache
+
+class ResponseCache:
+    '''A thread-safe cache of at most `max_entries` serialized responses, each stored with its ETag until its time to live runs out. When full, the least recently used response is dropped.'''
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+
+    def get(self, cache_key):
+        '''Returns the (body, ETag) cached under the key, or None if there is none or it has expired.'''
+        with self.lock:
+            entry = self.entries.get(cache_key)
+            if entry is None:
+                return None
+            body, etag, expiry_time = entry
+            if time.monotonic() >= expiry_time:
+                del self.entries[cache_key]
+                return None
+            self.entries.move_to_end(cache_key)
+            return body, etag
+
+    def put(self, cache_key, body, time_to_live):
+        '''Caches the body under the key for time_to_live seconds and returns its ETag.'''
+        etag = hashlib.sha1(body).hexdigest()
+        with self.lock:
+            self.entries[cache_key] = (body, etag, time.monotonic() + time_to_live)
+            self.entries.move_to_end(cache_key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return etag
+
+    def clear(self):
+        '''Drops every cached response and returns how many there were.'''
+        with self.lock:
+            number_of_entries = len(self.entries)
+            self.entries.clear()
+        return number_of_entries
+
+def query_database(query, cursor_name=None):
+    '''Executes the passed query (the name of a query of olympics_queries followed by its parameters) on a pooled connection and returns the resulting cursor, or aborts the request (see abort_on_database_error) if the query failed, so that nothing is cached for it. If a cursor name is passed the cursor is a server-side one, which sends its rows as they are fetched. The cursor is closed and the connection returned to the pool when the request ends.'''
     connection = get_database_connection()
-    cursor = ""
     try:
-        cursor = connection.cursor()
-        if len(query) == 1:
-            cursor.execute(query[0])
-        else:
-            cursor.execute(query[0], (query[1],))
+        cursor = connection.cursor(name=cursor_name)
+        flask.g.database_cursors.append(cursor)
+        olympics_queries.execute_query(cursor, query[0], query[1:])
     except Exception as e:
-        print(e)
+        abort_on_database_error(e)
     return cursor
 
+def abort_on_database_error(error):
+    '''Prints the error of a query and aborts the request with a 503 error if the database couldn't answer (it is unreachable, the connection dropped or the statement timed out), or with a 500 error otherwise.'''
+    print(error)
+    if isinstance(error, psycopg2.OperationalError):
+        flask.abort(503, description='The database is unavailable, please try again later.')
+    flask.abort(500, description='The database could not answer the query.')
+
 def get_database_connection():
-    '''Returns a connection to a database specified by 'config.py'.'''
-    connection = ""
-    try:
-        connection = psycopg2.connect(database=database, user=user, password=password)
-    except Exception as e:
-        print(e)
-    return connection
+    '''Returns the connection checked out of the pool for this request, checking one out on the first call (with --engine, a connection to the embedded engine instead). Aborts the request with a 503 error if no connection frees up in time or the database can't be reached.'''
+    if 'database_connection' not in flask.g:
+        try:
+            if engine_snapshot:
+                flask.g.database_connection = get_engine().connect()
+            else:
+                flask.g.database_connection = get_connection_pool().check_out()
+        except ConnectionPoolTimeout:
+            flask.abort(503, description='The database is busy, please try again later.')
+        except Exception as e:
+            print(e)
+            flask.abort(503, description='The database is unavailable.')
+        flask.g.database_cursors = []
+    return flask.g.database_connection
+
+@app.teardown_appcontext
+def return_database_connection(exception):
+    '''Closes the cursors opened during the request and returns its connection (if it checked one out) to the pool.'''
+    connection = flask.g.pop('database_connection', None)
+    if connection is not None:
+        release_database_connection(connection, flask.g.pop('database_cursors', []))
+
+def hand_database_connection_to(response):
+    '''Makes the passed streamed response, rather than the end of the request, close the request's cursors and return its connection, since the request ends (and its teardown runs) as soon as the response starts, while the response still reads from them. Returns the response.'''
+    connection = flask.g.pop('database_connection', None)
+    if connection is not None:
+        cursors = flask.g.pop('database_cursors', [])
+        response.call_on_close(lambda: release_database_connection(connection, cursors))
+    return response
+
+def release_database_connection(connection, cursors):
+    '''Closes the passed cursors and returns the connection to the pool.'''
+    for cursor in cursors:
+        try:
+            cursor.close()
+        except Exception as e:
+            print(e)
+    if not getattr(connection, 'is_embedded_engine', False):
+        get_connection_pool().check_in(connection)
+
+def get_engine():
+    '''Returns the embedded engine (see olympics_engine.py) shared by all the routes, loading its snapshot on first use.'''
+    global engine
+    with engine_lock:
+        if engine is None:
+            import olympics_engine
+            engine = olympics_engine.OlympicsEngine(engine_snapshot)
+    return engine
+
+def get_connection_pool():
+    '''Returns the connection pool shared by all the routes, creating it with the configured size and timeout on first use.'''
+    global connection_pool
+    with connection_pool_lock:
+        if connection_pool is None:
+            connection_pool = DatabaseConnectionPool(connection_pool_size, connection_pool_timeout)
+    return connection_pool
+
+class ConnectionPoolTimeout(Exception):
+    '''Raised when no pooled connection frees up before the pool's timeout.'''
+
+class DatabaseConnectionPool:
+    '''A thread-safe pool of at most `size` connections to the database specified by 'config.py'. Checking a connection out waits up to `timeout` seconds for one to be free, reuses an idle connection if a health check passes and opens a new one otherwise.'''
+
+    health_check_interval = 30.0
+
+    def __init__(self, size, timeout):
+        self.timeout = timeout
+        self.free_slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.idle_connections = []
+        self.last_used_times = {}
+
+    def check_out(self):
+        '''Returns a healthy connection, or raises ConnectionPoolTimeout if all the connections stay in use for `timeout` seconds.'''
+        wait_start_time = time.perf_counter()
+        got_free_slot = self.free_slots.acquire(timeout=self.timeout)
+        olympics_metrics.observe('olympics_pool_wait_seconds', time.perf_counter() - wait_start_time)
+        if not got_free_slot:
+            raise ConnectionPoolTimeout()
+        try:
+            while True:
+                with self.lock:
+                    connection = self.idle_connections.pop() if self.idle_connections else None
+                if connection is None:
+                    return psycopg2.connect(database=database, user=user, password=password)
+                if self.connection_is_healthy(connection):
+                    return connection
+                self.discard(connection)
+        except Exception:
+            self.free_slots.release()
+            raise
+
+    def check_in(self, connection):
+        '''Ends the connection's transaction and makes it available again, or closes it if it is broken.'''
+        try:
+            if not connection.closed:
+                connection.rollback()
+        except Exception as e:
+            print(e)
+        with self.lock:
+            if connection.closed:
+                self.last_used_times.pop(id(connection), None)
+            else:
+                self.last_used_times[id(connection)] = time.monotonic()
+                self.idle_connections.append(connection)
+        if connection.closed:
+            self.discard(connection)
+        self.free_slots.release()
+
+    def connection_is_healthy(self, connection):
+        '''Returns whether the idle connection is open and out of any transaction, pinging the server first if the connection has been idle longer than the health check interval.'''
+        if connection.closed or connection.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if time.monotonic() - self.last_used_times.get(id(connection), 0) < self.health_check_interval:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            connection.rollback()
+            return True
+        except Exception:
+            return False
+
+    def discard(self, connection):
+        '''Closes the passed connection and forgets it.'''
+        with self.lock:
+            self.last_used_times.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass
 
 def convert_cursor_to_list_of_dictionaries(cursor):
     '''Takes the passed cursor object and creates a list of dictionaries, with each dictionary representing one row of the cursor and the keys refering to the first item in the row.'''
     list = []
     for row in cursor:
-        dictionary = {}
-        if len(row) > 2:
-            values = []
-            for i in range(1, len(row)):
-                values.append(row[i])
-            dictionary[row[0]] = values
-        else:
-            dictionary[row[0]] = row[1]
-        list.append(dictionary)
+        list.append(convert_row_to_dictionary(row))
     return list
 
+def convert_row_to_dictionary(row):
+    '''Returns a dictionary representing the passed row, with the first item of the row as its key and the rest (or the second item alone if there are only two) as its value.'''
+    dictionary = {}
+    if len(row) > 2:
+        values = []
+        for i in range(1, len(row)):
+            values.append(row[i])
+        dictionary[row[0]] = values
+    else:
+        dictionary[row[0]] = row[1]
+    return dictionary
+
 def get_nocs_query():
-    '''Returns the SQL script that retrieves all NOCs in the database.'''
-    query = '''SELECT DISTINCT
-          national_olympic_committees.abbreviation,
-          national_olympic_committees.country
-      FROM
-          national_olympic_committees
-      ORDER BY
-          national_olympic_committees.abbreviation'''
-    return [query]
+    '''Returns the query that retrieves all NOCs in the database.'''
+    return ['nocs']
 
 def get_games_query():
-    '''Returns the SQL script that retrieves all the olympic games in the database.'''
-    query = '''SELECT
-      olympic_games.id,
-      olympic_games.year,
-      olympic_games.season,
-      olympic_games.city
-    FROM
-      olympic_games
-    ORDER BY
-      olympic_games.year'''
-    return [query]
-
-def get_medalists_query(games_id, noc_abbreviation):
-    '''Returns the SQL script that retrieves all the medalists at a specified game and (if applicable) belonging to a particular NOC.'''
-    query = ''
+    '''Returns the query that retrieves all the olympic games in the database.'''
+    return ['games']
+
+def get_medalists_query(games_id, noc_abbreviation, after=0):
+    '''Returns the query that retrieves all the medalists at a specified game and (if applicable) belonging to a particular NOC, with ids above `after`, ordered by athlete id.'''
     if noc_abbreviation == '-1':
-        return get_medalist_query_without_noc(games_id)
+        return ['medalists', games_id, after]
     else:
-        return get_medalist_query_with_noc(games_id, noc_abbreviation)
-
-def get_medalist_query_without_noc(games_id):
-    '''Returns the SQL script that retrieves all the medalists at a specified game.'''
-    query = '''SELECT
-          athletes.id,
-          athletes.name,
-          athletes.sex,
-          sports.sport,
-          events.event_title,
-          medals.medal
-      FROM
-          linking_table,
-          sports,
-          events,
-          athletes,
-          medals,
-          olympic_games
-      WHERE
-          linking_table.olympic_game_id = olympic_games.id AND
-          olympic_games.id = %s AND
-          linking_table.medal_id = medals.id AND
-          medals.medal != 'NA' AND
-          linking_table.athlete_id = athletes.id AND
-          linking_table.sport_id = sports.id AND
-          linking_table.event_id = events.id'''
-    return [query, games_id]
-
-def get_medalist_query_with_noc(games_id, noc_abbreviation):
-    '''Returns the SQL script that retrieves all the medalists at a specified game and from a specified NOC.'''
-    query = '''SELECT
-          athletes.id,
-          athletes.name,
-          athletes.sex,
-          sports.sport,
-          events.event_title,
-          medals.medal
-      FROM
-          linking_table,
-          sports,
-          events,
-          athletes,
-          medals,
-          national_olympic_committees,
-          olympic_games
-      WHERE
-          linking_table.olympic_game_id = olympic_games.id AND
-          olympic_games.id = ''' + str(games_id) + ''' AND
-          linking_table.national_olympic_committee_id = national_olympic_committees.id AND
-          national_olympic_committees.abbreviation = %s AND
-          linking_table.medal_id = medals.id AND
-          medals.medal != 'NA' AND
-          linking_table.athlete_id = athletes.id AND
-          linking_table.sport_id = sports.id AND
-          linking_table.event_id = events.id'''
-    return [query, noc_abbreviation]
+        return ['medalists_by_noc', games_id, noc_abbreviation, after]
+
+def get_medalists_batch_query(list_of_games_ids, list_of_noc_abbreviations):
+    '''Returns the query that retrieves, in one go, all the medalists at any of the specified games and (if any NOC abbreviations are passed) belonging to one of the specified NOCs, with the games id and NOC abbreviation of each, ordered by games, NOC and athlete.'''
+    if list_of_noc_abbreviations:
+        return ['medalists_batch_by_noc', list_of_games_ids, list_of_noc_abbreviations]
+    return ['medalists_batch', list_of_games_ids]
 
 if __name__ == '__main__':
-    host = sys.argv[1]
-    port = sys.argv[2]
-    app.run(host = host, port = port, debug = True)
+    parser = argparse.ArgumentParser('A Flask API for the Olympics database')
+    parser.add_argument('host', help='the host on which this application is running')
+    parser.add_argument('port', type=int, help='the port on which this application is listening')
+    parser.add_argument('--pool-size', type=int, default=connection_pool_size, help='the most database connections open at once (default 10)')
+    parser.add_argument('--pool-timeout', type=float, default=connection_pool_timeout, help='how many seconds a request waits for a free database connection before failing with a 503 error (default 5)')
+    parser.add_argument('--cache-size', type=int, default=response_cache_size, help='the most responses kept in the response cache (default 256)')
+    parser.add_argument('--engine', metavar='SNAPSHOT', help='answer the queries from this snapshot (built by olympics_engine.py) with the embedded engine instead of the database')
+    parser.add_argument('--no-debug', action='store_true', help='run without the debugger and reloader, e.g. when benchmarking (see load_test.py)')
+    arguments = parser.parse_args()
+    connection_pool_size = arguments.pool_size
+    connection_pool_timeout = arguments.pool_timeout
+    response_cache_size = arguments.cache_size
+    engine_snapshot = arguments.engine
+    app.run(host = arguments.host, port = arguments.port, debug = not arguments.no_debug)